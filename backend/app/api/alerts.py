@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, insert, update, desc, func, case, literal, lambda_stmt, tuple_
+from sqlalchemy.orm import selectinload, raiseload
 from typing import List, Optional
 from datetime import datetime, timedelta
 
@@ -8,6 +9,7 @@ from app.db.database import get_db
 from app.models.alert import Alert
 from app.models.device import Device
 from app.api.auth import get_current_user
+from app.api.pagination import encode_cursor, decode_cursor
 from app.models.user import User
 from app.services.firebase_service import FirebaseService
 
@@ -15,24 +17,44 @@ router = APIRouter()
 
 @router.get("/")
 async def get_alerts(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     limit: int = 50,
     severity: Optional[str] = None,
-    alert_type: Optional[str] = None
+    alert_type: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
-    query = select(Alert).where(Alert.user_id == current_user.id)
+    # lambda_stmt caches the compiled SQL per filter combination; the
+    # closure variables become bound parameters
+    user_id = current_user.id
+    query = lambda_stmt(
+        lambda: select(Alert)
+        .options(selectinload(Alert.device), raiseload('*'))
+        .where(Alert.user_id == user_id)
+    )
     
     if severity:
-        query = query.where(Alert.severity == severity)
+        query += lambda q: q.where(Alert.severity == severity)
     if alert_type:
-        query = query.where(Alert.alert_type == alert_type)
-    
-    query = query.order_by(desc(Alert.created_at)).limit(limit)
+        query += lambda q: q.where(Alert.alert_type == alert_type)
+    if cursor:
+        # Keyset pagination: an index range scan on (user_id, created_at, id) at any depth;
+        # id breaks ties so alerts sharing a timestamp are not skipped at a page boundary
+        cursor_at, cursor_id = decode_cursor(cursor)
+        if cursor_id is None:
+            query += lambda q: q.where(Alert.created_at < cursor_at)
+        else:
+            query += lambda q: q.where(tuple_(Alert.created_at, Alert.id) < tuple_(cursor_at, cursor_id))
+    
+    query += lambda q: q.order_by(desc(Alert.created_at), desc(Alert.id)).limit(limit)
     
     result = await db.execute(query)
     alerts = result.scalars().all()
     
+    if len(alerts) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(alerts[-1].created_at, alerts[-1].id)
+    
     return [{
         "id": alert.id,
         "alert_type": alert.alert_type,
@@ -41,7 +63,7 @@ async def get_alerts(
         "device_id": alert.device.device_id,
         "is_acknowledged": alert.is_acknowledged,
         "description": alert.description,
-        "metadata": alert.metadata,
+        "metadata": alert.meta,
         "s3_audio_url": alert.s3_audio_url,
         "s3_video_url": alert.s3_video_url,
         "duration_seconds": alert.duration_seconds,
@@ -55,44 +77,53 @@ async def create_alert(
     severity: str,
     confidence_score: float,
     device_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
     description: Optional[str] = None,
     metadata: Optional[dict] = None,
     s3_audio_url: Optional[str] = None,
     s3_video_url: Optional[str] = None,
     duration_seconds: Optional[float] = None,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    # Verify device belongs to user
+    values = {
+        "alert_type": alert_type,
+        "severity": severity,
+        "confidence_score": confidence_score,
+        "description": description,
+        "metadata": metadata,
+        "s3_audio_url": s3_audio_url,
+        "s3_video_url": s3_video_url,
+        "duration_seconds": duration_seconds
+    }
+    columns = Alert.__table__.c
+    
+    # Verify device belongs to user and create the alert in one round trip:
+    # INSERT ... SELECT inserts nothing when the device isn't the user's
     result = await db.execute(
-        select(Device).where(Device.device_id == device_id, Device.user_id == current_user.id)
+        insert(Alert)
+        .from_select(
+            [*values, "user_id", "device_id"],
+            select(
+                *(literal(value, columns[name].type) for name, value in values.items()),
+                Device.user_id,
+                Device.id
+            ).where(Device.device_id == device_id, Device.user_id == current_user.id)
+        )
+        .returning(Alert.id)
     )
-    device = result.scalar_one_or_none()
-    if not device:
+    alert_id = result.scalar_one_or_none()
+    if alert_id is None:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    # Create alert
-    alert = Alert(
-        alert_type=alert_type,
-        severity=severity,
-        confidence_score=confidence_score,
-        user_id=current_user.id,
-        device_id=device.id,
-        description=description,
-        metadata=metadata,
-        s3_audio_url=s3_audio_url,
-        s3_video_url=s3_video_url,
-        duration_seconds=duration_seconds
-    )
-    
-    db.add(alert)
     await db.commit()
-    await db.refresh(alert)
+    await request.app.state.redis_service.invalidate_alert_stats(current_user.id)
     
     # Send push notification
     background_tasks.add_task(
         send_alert_notification,
+        request.app.state.firebase_service,
         current_user.firebase_uid,
         alert_type,
         severity,
@@ -100,7 +131,7 @@ async def create_alert(
     )
     
     return {
-        "id": alert.id,
+        "id": alert_id,
         "message": "Alert created successfully",
         "alert_type": alert_type,
         "severity": severity
@@ -109,63 +140,85 @@ async def create_alert(
 @router.patch("/{alert_id}/acknowledge")
 async def acknowledge_alert(
     alert_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     result = await db.execute(
-        select(Alert).where(Alert.id == alert_id, Alert.user_id == current_user.id)
+        update(Alert)
+        .where(Alert.id == alert_id, Alert.user_id == current_user.id)
+        .values(is_acknowledged=True, acknowledged_at=datetime.utcnow())
+        .returning(Alert.id)
     )
-    alert = result.scalar_one_or_none()
-    if not alert:
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Alert not found")
     
-    alert.is_acknowledged = True
-    alert.acknowledged_at = datetime.utcnow()
-    
     await db.commit()
+    await request.app.state.redis_service.invalidate_alert_stats(current_user.id)
     
     return {"message": "Alert acknowledged"}
 
 @router.get("/stats")
 async def get_alert_stats(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     days: int = 7
 ):
-    since_date = datetime.utcnow() - timedelta(days=days)
+    redis_service = request.app.state.redis_service
+    version = await redis_service.get_alert_stats_version(current_user.id)
+    cached = await redis_service.get_cached_alert_stats(current_user.id, days, version)
+    if cached is not None:
+        return cached
     
-    result = await db.execute(
-        select(Alert).where(
-            Alert.user_id == current_user.id,
-            Alert.created_at >= since_date
-        )
+    since_date = datetime.utcnow() - timedelta(days=days)
+    window = (Alert.user_id == current_user.id, Alert.created_at >= since_date)
+    
+    # Aggregate in Postgres; only a handful of rows come back over the wire.
+    # The statements share one AsyncSession, which cannot multiplex queries,
+    # so they run back to back rather than through asyncio.gather.
+    totals = (await db.execute(
+        select(
+            func.count(),
+            func.sum(case((Alert.is_acknowledged, 1), else_=0)),
+            func.avg(Alert.confidence_score)
+        ).where(*window)
+    )).one()
+    by_severity = await db.execute(
+        select(Alert.severity, func.count()).where(*window).group_by(Alert.severity)
+    )
+    by_type = await db.execute(
+        select(Alert.alert_type, func.count()).where(*window).group_by(Alert.alert_type)
     )
-    alerts = result.scalars().all()
+    
+    total_alerts, acknowledged, avg_confidence = totals
     
     stats = {
-        "total_alerts": len(alerts),
-        "acknowledged": sum(1 for a in alerts if a.is_acknowledged),
-        "by_severity": {},
-        "by_type": {},
-        "avg_confidence": sum(a.confidence_score for a in alerts) / len(alerts) if alerts else 0
+        "total_alerts": total_alerts,
+        "acknowledged": acknowledged or 0,
+        "by_severity": dict(by_severity.all()),
+        "by_type": dict(by_type.all()),
+        "avg_confidence": float(avg_confidence) if avg_confidence is not None else 0
     }
     
-    for alert in alerts:
-        stats["by_severity"][alert.severity] = stats["by_severity"].get(alert.severity, 0) + 1
-        stats["by_type"][alert.alert_type] = stats["by_type"].get(alert.alert_type, 0) + 1
-    
+    await redis_service.cache_alert_stats(current_user.id, days, version, stats)
     return stats
 
-async def send_alert_notification(firebase_uid: str, alert_type: str, severity: str, description: str):
+async def send_alert_notification(
+    firebase_service: FirebaseService,
+    firebase_uid: str,
+    alert_type: str,
+    severity: str,
+    description: str
+):
     if not firebase_uid:
         return
     
-    firebase_service = FirebaseService()
-    
     title = f"Baby Monitor Alert - {alert_type.replace('_', ' ').title()}"
     body = description or f"{severity.title()} alert detected"
     
-    await firebase_service.send_notification(
+    # Batched per recipient so an alert burst shares one dispatch
+    await firebase_service.queue_notification(
         firebase_uid,
         title,
         body,
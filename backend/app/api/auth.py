@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, lambda_stmt
 from datetime import datetime, timedelta
 from typing import Optional
 import hashlib
@@ -10,7 +10,9 @@ from passlib.context import CryptContext
 
 from app.db.database import get_db
 from app.models.user import User
+from app.models.device import Device
 from app.core.config import settings
+from app.services.redis_service import RedisService
 
 router = APIRouter()
 
@@ -47,12 +49,35 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.email == username))
+    # Runs on every authenticated request; reuse the cached compiled statement
+    result = await db.execute(lambda_stmt(lambda: select(User).where(User.email == username)))
     user = result.scalar_one_or_none()
     if user is None:
         raise credentials_exception
     return user
 
+async def resolve_device(
+    db: AsyncSession,
+    redis_service: RedisService,
+    device_id: str,
+    user_id: int
+) -> Optional[int]:
+    """Return the internal id of device_id if it belongs to user_id"""
+    # Device ownership doesn't change, so a cached lookup skips the devices query
+    owner = await redis_service.get_cached_device_owner(device_id)
+    if owner is None:
+        result = await db.execute(
+            select(Device.id, Device.user_id).where(Device.device_id == device_id)
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None
+        
+        owner = {"id": row.id, "user_id": row.user_id}
+        await redis_service.cache_device_owner(device_id, row.id, row.user_id)
+    
+    return owner["id"] if owner["user_id"] == user_id else None
+
 @router.post("/register")
 async def register_user(
     email: str,
@@ -78,7 +103,6 @@ async def register_user(
     
     db.add(new_user)
     await db.commit()
-    await db.refresh(new_user)
     
     return {"message": "User created successfully", "user_id": new_user.id}
 
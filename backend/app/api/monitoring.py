@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, FastAPI, Request
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from fastapi.responses import Response
 import psutil
 import time
+import asyncio
+import logging
 from typing import Dict, Any
 
 from app.api.auth import get_current_user
 from app.models.user import User
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+SYSTEM_SAMPLE_INTERVAL_SECONDS = 5
 
 # Prometheus metrics
 REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint'])
@@ -19,31 +24,44 @@ ML_INFERENCE_LATENCY = Histogram('ml_inference_duration_seconds', 'ML inference
 SYSTEM_MEMORY_USAGE = Gauge('system_memory_usage_percent', 'System memory usage percentage')
 SYSTEM_CPU_USAGE = Gauge('system_cpu_usage_percent', 'System CPU usage percentage')
 
+def sample_system_metrics(app: FastAPI):
+    """Refresh system gauges and the cached health snapshot"""
+    cpu_percent = psutil.cpu_percent(interval=None)
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+    
+    SYSTEM_CPU_USAGE.set(cpu_percent)
+    SYSTEM_MEMORY_USAGE.set(memory.percent)
+    
+    app.state.health_snapshot = {
+        "cpu_percent": cpu_percent,
+        "memory_percent": memory.percent,
+        "memory_available_gb": memory.available / (1024**3),
+        "disk_percent": (disk.used / disk.total) * 100,
+        "disk_free_gb": disk.free / (1024**3)
+    }
+
+async def system_metrics_loop(app: FastAPI, interval: float = SYSTEM_SAMPLE_INTERVAL_SECONDS):
+    """Sample system metrics in the background so scrapes never call psutil"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            sample_system_metrics(app)
+        except Exception as e:
+            logger.error(f"System metrics sampling failed: {e}")
+
 @router.get("/metrics")
 async def get_metrics():
     """Prometheus metrics endpoint"""
-    # Update system metrics
-    SYSTEM_MEMORY_USAGE.set(psutil.virtual_memory().percent)
-    SYSTEM_CPU_USAGE.set(psutil.cpu_percent())
-    
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @router.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """Detailed health check endpoint"""
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
-    
     return {
         "status": "healthy",
         "timestamp": time.time(),
-        "system": {
-            "cpu_percent": psutil.cpu_percent(),
-            "memory_percent": memory.percent,
-            "memory_available_gb": memory.available / (1024**3),
-            "disk_percent": (disk.used / disk.total) * 100,
-            "disk_free_gb": disk.free / (1024**3)
-        },
+        "system": request.app.state.health_snapshot,
         "services": {
             "database": "connected",  # Could add actual DB health check
             "kafka": "connected",     # Could add actual Kafka health check
@@ -0,0 +1,18 @@
+from fastapi import HTTPException
+from datetime import datetime
+from typing import Optional, Tuple
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Keyset cursor for rows ordered by (timestamp, id), newest first"""
+    return f"{timestamp.isoformat()}_{row_id}"
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Optional[int]]:
+    """Split a cursor into its timestamp and id; bare timestamps from older clients carry no id"""
+    timestamp, separator, row_id = cursor.rpartition("_")
+    if not separator:
+        timestamp, row_id = cursor, None
+    
+    try:
+        return datetime.fromisoformat(timestamp), int(row_id) if row_id is not None else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
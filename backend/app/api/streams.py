@@ -1,47 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, update, lambda_stmt, tuple_
+from sqlalchemy.orm import selectinload, raiseload
+from typing import List, Optional
 import uuid
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.db.database import get_db
 from app.models.device import Device
 from app.models.stream_session import StreamSession
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, resolve_device
+from app.api.pagination import encode_cursor, decode_cursor
 from app.models.user import User
 from app.services.kafka_service import KafkaService
-from app.services.s3_service import S3Service
 
 router = APIRouter()
 
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
 @router.post("/start-session/{device_id}")
 async def start_stream_session(
     device_id: str,
+    request: Request,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
+    redis_service = request.app.state.redis_service
+    
     # Verify device belongs to user
-    result = await db.execute(
-        select(Device).where(Device.device_id == device_id, Device.user_id == current_user.id)
-    )
-    device = result.scalar_one_or_none()
-    if not device:
+    device_pk = await resolve_device(db, redis_service, device_id, current_user.id)
+    if device_pk is None:
         raise HTTPException(status_code=404, detail="Device not found")
     
     # Create new stream session
     session_id = str(uuid.uuid4())
     stream_session = StreamSession(
         session_id=session_id,
-        device_id=device.id,
+        device_id=device_pk,
         is_active=True
     )
     
     db.add(stream_session)
     await db.commit()
-    await db.refresh(stream_session)
+    
+    # Chunk uploads check ownership and count bytes against this hash, not Postgres
+    await redis_service.start_stream_session_state(session_id, device_id, current_user.id)
     
     return {
         "session_id": session_id,
@@ -52,6 +57,7 @@ async def start_stream_session(
 @router.post("/end-session/{session_id}")
 async def end_stream_session(
     session_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -62,80 +68,156 @@ async def end_stream_session(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    # Fold the bytes counted in Redis into the session row in the same UPDATE
+    redis_service = request.app.state.redis_service
+    buffered_bytes = await redis_service.get_stream_session_bytes(session_id)
+    
     # Update session
-    session.ended_at = datetime.utcnow()
+    session.ended_at = datetime.now(timezone.utc)
     session.is_active = False
+    session.total_bytes_received = StreamSession.total_bytes_received + buffered_bytes
     if session.started_at:
         duration = (session.ended_at - session.started_at).total_seconds()
         session.duration_seconds = duration
     
     await db.commit()
     
+    # Only drop the counter once it is persisted, so a failed commit keeps the bytes
+    await redis_service.end_stream_session_state(session_id)
+    
     return {"message": "Session ended successfully"}
 
 @router.post("/upload-chunk/{session_id}")
 async def upload_stream_chunk(
     session_id: str,
     chunk_type: str,  # 'audio' or 'video'
-    file: UploadFile = File(...),
+    request: Request,
     background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(
-        select(StreamSession).where(StreamSession.session_id == session_id)
-    )
-    session = result.scalar_one_or_none()
-    if not session or not session.is_active:
+    redis_service = request.app.state.redis_service
+    
+    # Verify session belongs to user
+    state = await redis_service.get_stream_session_state(session_id)
+    if state is not None:
+        owner = {"device_id": state["device_id"], "user_id": int(state["user_id"])}
+    else:
+        # Not tracked in Redis (e.g. started before a Redis restart); fall back to Postgres
+        owner = await redis_service.get_cached_stream_session_owner(session_id)
+    
+    if owner is None:
+        # Ended sessions are rejected here, before anything is streamed to S3
+        result = await db.execute(
+            select(Device.device_id, Device.user_id)
+            .join(StreamSession)
+            .where(StreamSession.session_id == session_id, StreamSession.is_active == True)
+        )
+        row = result.one_or_none()
+        if row is not None:
+            owner = {"device_id": row.device_id, "user_id": row.user_id}
+            await redis_service.cache_stream_session_owner(session_id, row.device_id, row.user_id)
+    
+    if owner is None or owner["user_id"] != current_user.id:
         raise HTTPException(status_code=404, detail="Active session not found")
+    device_id = owner["device_id"]
+    
+    # Stream the upload to S3 in fixed blocks instead of reading it into memory
+    s3_url, chunk_size = await request.app.state.s3_service.upload_chunk_stream(
+        device_id,
+        session_id,
+        chunk_type,
+        _iter_upload(file)
+    )
+    
+    # Update session stats; Redis holds the counter until the session ends
+    total_bytes = None
+    if state is not None:
+        total_bytes = await redis_service.add_stream_session_bytes(session_id, chunk_size)
     
-    # Read file data
-    chunk_data = await file.read()
+    if total_bytes is None:
+        # Atomic so concurrent chunks for a session don't lose increments
+        result = await db.execute(
+            update(StreamSession)
+            .where(StreamSession.session_id == session_id, StreamSession.is_active == True)
+            .values(total_bytes_received=StreamSession.total_bytes_received + chunk_size)
+            .returning(StreamSession.id)
+        )
+        if result.scalar_one_or_none() is None:
+            if s3_url:
+                await request.app.state.s3_service.delete_object(s3_url)
+            raise HTTPException(status_code=404, detail="Active session not found")
+        await db.commit()
     
     # Process in background
     background_tasks.add_task(
         process_stream_chunk,
+        request.app.state.kafka_service,
         session_id,
         chunk_type,
-        chunk_data
+        chunk_size,
+        s3_url
     )
     
-    # Update session stats
-    session.total_bytes_received += len(chunk_data)
-    await db.commit()
-    
     return {
         "message": "Chunk received",
-        "chunk_size": len(chunk_data),
+        "chunk_size": chunk_size,
         "type": chunk_type
     }
 
-async def process_stream_chunk(session_id: str, chunk_type: str, data: bytes):
-    # Send to Kafka for ML processing
-    kafka_service = KafkaService()
+async def _iter_upload(file: UploadFile, block_size: int = UPLOAD_BLOCK_SIZE):
+    while block := await file.read(block_size):
+        yield block
+
+async def process_stream_chunk(
+    kafka_service: KafkaService,
+    session_id: str,
+    chunk_type: str,
+    data_size: int,
+    s3_url: Optional[str]
+):
+    # Queue for the next batched Kafka produce; ML consumers fan the batch back out
     topic = "baby-audio-stream" if chunk_type == "audio" else "baby-video-stream"
     
-    await kafka_service.send_message(topic, {
+    await kafka_service.buffer_message(topic, {
         "session_id": session_id,
         "chunk_type": chunk_type,
         "timestamp": datetime.utcnow().isoformat(),
-        "data_size": len(data)
+        "data_size": data_size,
+        "s3_url": s3_url
     })
 
 @router.get("/sessions")
 async def get_user_sessions(
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    limit: int = 50,
+    cursor: Optional[str] = None
 ):
-    result = await db.execute(
-        select(StreamSession)
+    user_id = current_user.id
+    query = lambda_stmt(
+        lambda: select(StreamSession)
+        .options(selectinload(StreamSession.device), raiseload('*'))
         .join(Device)
-        .where(Device.user_id == current_user.id)
-        .order_by(StreamSession.started_at.desc())
-        .limit(50)
+        .where(Device.user_id == user_id)
     )
+    if cursor:
+        # id breaks ties between sessions started at the same instant
+        cursor_at, cursor_id = decode_cursor(cursor)
+        if cursor_id is None:
+            query += lambda q: q.where(StreamSession.started_at < cursor_at)
+        else:
+            query += lambda q: q.where(tuple_(StreamSession.started_at, StreamSession.id) < tuple_(cursor_at, cursor_id))
+    query += lambda q: q.order_by(StreamSession.started_at.desc(), StreamSession.id.desc()).limit(limit)
+    
+    result = await db.execute(query)
     sessions = result.scalars().all()
     
+    if len(sessions) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(sessions[-1].started_at, sessions[-1].id)
+    
     return [{
         "session_id": session.session_id,
         "device_id": session.device.device_id,
@@ -1,15 +1,29 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from fastapi import WebSocket
-import json
+import orjson
 import asyncio
 import logging
 
+from app.services.redis_service import RedisService
+
 logger = logging.getLogger(__name__)
 
+ALERTS_BROADCAST_CHANNEL = "alerts:broadcast"
+
+# Pause before resubscribing after the pub/sub connection fails
+BROADCAST_RETRY_BACKOFF_SECONDS = 1.0
+
+def _encode(message: dict) -> str:
+    # Naive datetimes in this app are UTC. Frames stay text because the
+    # mobile client JSON.parses event.data.
+    return orjson.dumps(message, option=orjson.OPT_NAIVE_UTC).decode()
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, redis_service: Optional[RedisService] = None):
         self.active_connections: Dict[str, WebSocket] = {}
         self.device_metadata: Dict[str, dict] = {}
+        # Sockets are spread across uvicorn workers; Redis pub/sub reaches all of them
+        self.redis_service = redis_service
     
     async def connect(self, websocket: WebSocket, device_id: str):
         await websocket.accept()
@@ -31,27 +45,68 @@ class ConnectionManager:
         if device_id in self.active_connections:
             websocket = self.active_connections[device_id]
             try:
-                await websocket.send_text(json.dumps(message))
+                await websocket.send_text(_encode(message))
             except Exception as e:
                 logger.error(f"Failed to send message to {device_id}: {e}")
                 self.disconnect(device_id)
     
     async def broadcast_alert(self, alert_data: dict):
-        disconnected_devices = []
+        # Encode once; every device on every worker receives the same frame
+        payload = _encode({
+            "type": "alert",
+            "data": alert_data
+        })
+        
+        if self.redis_service and await self.redis_service.publish(ALERTS_BROADCAST_CHANNEL, payload):
+            return
         
-        for device_id, websocket in self.active_connections.items():
+        # No Redis, or no worker subscribed: only this worker's devices can be reached
+        await self._broadcast_local(payload)
+    
+    async def listen_for_broadcasts(self):
+        """Relay frames published on the broadcast channel to this worker's devices"""
+        while True:
+            pubsub = None
             try:
-                await websocket.send_text(json.dumps({
-                    "type": "alert",
-                    "data": alert_data
-                }))
+                pubsub = self.redis_service.redis.pubsub()
+                await pubsub.subscribe(ALERTS_BROADCAST_CHANNEL)
+                
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        await self._broadcast_local(message["data"])
+                        
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Failed to broadcast to {device_id}: {e}")
-                disconnected_devices.append(device_id)
+                logger.error(f"Alert broadcast subscription failed: {e}")
+            finally:
+                if pubsub is not None:
+                    await self._close_pubsub(pubsub)
+            
+            # The listener must outlive Redis hiccups, or this worker stops receiving alerts
+            await asyncio.sleep(BROADCAST_RETRY_BACKOFF_SECONDS)
+    
+    @staticmethod
+    async def _close_pubsub(pubsub):
+        try:
+            await pubsub.unsubscribe(ALERTS_BROADCAST_CHANNEL)
+            await pubsub.close()
+        except Exception as e:
+            logger.warning(f"Failed to close alert broadcast subscription: {e}")
+    
+    async def _broadcast_local(self, payload: str):
+        # Snapshot the connections so results line up even if one disconnects mid-send
+        connections = list(self.active_connections.items())
+        results = await asyncio.gather(
+            *(websocket.send_text(payload) for _, websocket in connections),
+            return_exceptions=True
+        )
         
         # Clean up disconnected devices
-        for device_id in disconnected_devices:
-            self.disconnect(device_id)
+        for (device_id, _), result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to broadcast to {device_id}: {result}")
+                self.disconnect(device_id)
     
     def get_active_devices(self) -> List[str]:
         return list(self.active_connections.keys())
@@ -1,17 +1,32 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    pool_size=20,
-    max_overflow=0,
-    pool_pre_ping=True
-)
+if settings.DATABASE_USE_PGBOUNCER:
+    # PgBouncer (transaction mode) owns pooling; asyncpg's prepared statement
+    # cache can't survive server connections being swapped between clients
+    engine = create_async_engine(
+        settings.DATABASE_URL,
+        echo=settings.DEBUG,
+        poolclass=NullPool,
+        query_cache_size=1200,
+        connect_args={"statement_cache_size": 0}
+    )
+else:
+    engine = create_async_engine(
+        settings.DATABASE_URL,
+        echo=settings.DEBUG,
+        poolclass=AsyncAdaptedQueuePool,
+        query_cache_size=1200,
+        pool_size=20,
+        max_overflow=10,
+        pool_pre_ping=True,
+        pool_recycle=1800
+    )
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -19,7 +34,8 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
-Base = declarative_base()
+class Base(DeclarativeBase):
+    pass
 
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
@@ -1,15 +1,22 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
+import httpx
 import logging
 
 from app.api import auth, monitoring, streams, alerts
+from app.api.monitoring import sample_system_metrics, system_metrics_loop
 from app.core.config import settings
 from app.core.websocket_manager import ConnectionManager
 from app.db.database import engine, create_tables
 from app.services.kafka_service import KafkaService
 from app.services.redis_service import RedisService
+from app.services.firebase_service import FirebaseService
+from app.services.s3_service import S3Service
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,23 +30,41 @@ async def lifespan(app: FastAPI):
     # Initialize services
     app.state.kafka_service = KafkaService()
     app.state.redis_service = RedisService()
-    app.state.connection_manager = ConnectionManager()
+    app.state.connection_manager = ConnectionManager(redis_service=app.state.redis_service)
+    app.state.s3_service = S3Service(redis_service=app.state.redis_service)
+    app.state.firebase_service = FirebaseService(
+        client=httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=300.0)
+        )
+    )
     
     await app.state.kafka_service.start()
     await app.state.redis_service.connect()
+    await app.state.firebase_service.warmup()
+    
+    # Prime the psutil counters, then keep sampling off the request path
+    sample_system_metrics(app)
+    app.state.metrics_task = asyncio.create_task(system_metrics_loop(app))
+    app.state.broadcast_task = asyncio.create_task(app.state.connection_manager.listen_for_broadcasts())
     
     yield
     
     # Shutdown
     logger.info("Shutting down services...")
+    app.state.metrics_task.cancel()
+    app.state.broadcast_task.cancel()
     await app.state.kafka_service.stop()
     await app.state.redis_service.disconnect()
+    await app.state.firebase_service.close()
 
 app = FastAPI(
     title="Smart Baby Monitor API",
     description="Real-time ML-powered baby monitoring system",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -50,6 +75,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Alert/session lists and Prometheus text compress well; mobile egress is the bottleneck
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(monitoring.router, prefix="/api/v1/monitoring", tags=["monitoring"])
@@ -1,13 +1,13 @@
 import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
 import time
-import json
+import xxhash
 from datetime import datetime
 
 from app.ml.audio_classifier import AudioInferenceService
 from app.ml.video_detector import VideoInferenceService
-from app.services.kafka_service import KafkaService
+from app.services.kafka_service import KafkaService, LazyMessage
 from app.services.redis_service import RedisService
 from app.services.s3_service import S3Service
 from app.core.config import settings
@@ -15,25 +15,46 @@ from app.api.monitoring import ML_INFERENCE_LATENCY, ALERTS_GENERATED
 
 logger = logging.getLogger(__name__)
 
+# Audio micro-batching: one model call per this many clips or this long a wait
+AUDIO_BATCH_MAX_SIZE = 16
+AUDIO_BATCH_WINDOW_SECONDS = 0.01
+
 class MLInferenceService:
     """Main ML inference service that coordinates audio and video analysis"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        kafka_service: Optional[KafkaService] = None,
+        redis_service: Optional[RedisService] = None,
+        s3_service: Optional[S3Service] = None
+    ):
         self.audio_service = AudioInferenceService()
         self.video_service = VideoInferenceService()
-        self.kafka_service: Optional[KafkaService] = None
-        self.redis_service: Optional[RedisService] = None
-        self.s3_service = S3Service()
+        self.kafka_service = kafka_service
+        self.redis_service = redis_service
+        self.s3_service = s3_service or S3Service()
+        # Only start/stop the connections this service created itself
+        self._owns_kafka = kafka_service is None
+        self._owns_redis = redis_service is None
+        self.audio_queue: Optional[asyncio.Queue] = None
+        self.audio_batch_task: Optional[asyncio.Task] = None
+        self._timestamp_cache = (0, "")
         self.running = False
     
     async def start(self):
         """Start the ML inference service"""
         try:
-            self.kafka_service = KafkaService()
-            self.redis_service = RedisService()
+            if self._owns_kafka:
+                self.kafka_service = KafkaService()
+                await self.kafka_service.start()
+            
+            if self._owns_redis:
+                self.redis_service = RedisService()
+                await self.redis_service.connect()
             
-            await self.kafka_service.start()
-            await self.redis_service.connect()
+            # Start the audio batcher ahead of the consumers that feed it
+            self.audio_queue = asyncio.Queue()
+            self.audio_batch_task = asyncio.create_task(self._audio_batch_loop())
             
             # Start Kafka consumers
             asyncio.create_task(self._consume_audio_stream())
@@ -50,25 +71,92 @@ class MLInferenceService:
         """Stop the ML inference service"""
         self.running = False
         
-        if self.kafka_service:
+        if self.audio_batch_task:
+            self.audio_batch_task.cancel()
+        
+        if self.kafka_service and self._owns_kafka:
             await self.kafka_service.stop()
         
-        if self.redis_service:
+        if self.redis_service and self._owns_redis:
             await self.redis_service.disconnect()
         
         logger.info("ML Inference Service stopped")
     
+    async def _detect_cry_cached(
+        self,
+        audio_data: bytes,
+        detect: Callable[[bytes], Awaitable[Dict[str, Any]]],
+        session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Reuse the result for byte-identical audio (silence, steady background);
+        with a session_id the result is also cached for that session"""
+        content_hash = xxhash.xxh3_64_hexdigest(audio_data)
+        
+        if self.redis_service:
+            cached = await self.redis_service.get_cached_cry_result(content_hash)
+            if cached is not None:
+                if session_id:
+                    await self._cache_inference_result(session_id, "audio", cached)
+                return cached
+        
+        result = await detect(audio_data)
+        
+        if self.redis_service:
+            if "error" in result:
+                if session_id:
+                    await self._cache_inference_result(session_id, "audio", result)
+            elif session_id:
+                await self.redis_service.cache_audio_results(session_id, content_hash, result)
+            else:
+                await self.redis_service.cache_cry_result(content_hash, result)
+        
+        return result
+    
+    async def _detect_cry_batched(self, audio_data: bytes) -> Dict[str, Any]:
+        """Queue a clip for the next audio batch and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        await self.audio_queue.put((audio_data, future))
+        return await future
+    
+    async def _audio_batch_loop(self):
+        """Collect queued clips into batches and run them through the audio model"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch: List[Tuple[bytes, asyncio.Future]] = [await self.audio_queue.get()]
+            deadline = loop.time() + AUDIO_BATCH_WINDOW_SECONDS
+            
+            while len(batch) < AUDIO_BATCH_MAX_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.audio_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                results = await self.audio_service.detect_cry_batch([audio_data for audio_data, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                logger.error(f"Audio batch failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
     async def _consume_audio_stream(self):
         """Consume audio stream messages from Kafka"""
         if not self.kafka_service:
             return
         
-        async def process_audio_message(message: Dict[str, Any]):
+        async def process_audio_message(message: LazyMessage):
             try:
-                session_id = message.get("session_id")
-                device_id = message.get("device_id")
+                # device_id comes from the record header; the value is parsed only past the rate limit
+                device_id = message.device_id
                 
-                if not session_id or not device_id:
+                if not device_id:
                     logger.warning("Invalid audio message: missing session_id or device_id")
                     return
                 
@@ -77,20 +165,22 @@ class MLInferenceService:
                     logger.warning(f"Rate limit exceeded for audio processing: {device_id}")
                     return
                 
+                session_id = message.get("session_id")
+                if not session_id:
+                    logger.warning("Invalid audio message: missing session_id or device_id")
+                    return
+                
                 # Simulate fetching audio data (in real implementation, would get from S3 or message)
-                audio_data = b'\x00' * 16000  # Dummy audio data
+                audio_data = bytes(2 * 16000)  # Dummy audio data, one second of PCM16
                 
                 # Process audio
                 start_time = time.time()
-                result = await self.audio_service.detect_cry(audio_data)
+                result = await self._detect_cry_cached(audio_data, self._detect_cry_batched, session_id)
                 inference_time = time.time() - start_time
                 
                 # Record metrics
                 ML_INFERENCE_LATENCY.labels(model_type='audio').observe(inference_time)
                 
-                # Cache result
-                await self._cache_inference_result(session_id, "audio", result)
-                
                 # Check for alerts
                 await self._check_audio_alerts(device_id, session_id, result)
                 
@@ -107,12 +197,12 @@ class MLInferenceService:
         if not self.kafka_service:
             return
         
-        async def process_video_message(message: Dict[str, Any]):
+        async def process_video_message(message: LazyMessage):
             try:
-                session_id = message.get("session_id")
-                device_id = message.get("device_id")
+                # device_id comes from the record header; the value is parsed only past the rate limit
+                device_id = message.device_id
                 
-                if not session_id or not device_id:
+                if not device_id:
                     logger.warning("Invalid video message: missing session_id or device_id")
                     return
                 
@@ -121,12 +211,17 @@ class MLInferenceService:
                     logger.warning(f"Rate limit exceeded for video processing: {device_id}")
                     return
                 
+                session_id = message.get("session_id")
+                if not session_id:
+                    logger.warning("Invalid video message: missing session_id or device_id")
+                    return
+                
                 # Simulate fetching video frame data
                 frame_data = b'\xff\xd8\xff' + b'\x00' * 10000  # Dummy JPEG frame
                 
                 # Process video
                 start_time = time.time()
-                result = await self.video_service.analyze_video_frame(frame_data)
+                result = await self.video_service.analyze_video_frame(frame_data, device_id)
                 inference_time = time.time() - start_time
                 
                 # Record metrics
@@ -160,6 +255,14 @@ class MLInferenceService:
         
         await self.redis_service.cache_ml_result(session_id, model_type, result)
     
+    def _alert_timestamp(self) -> str:
+        """UTC ISO-8601 timestamp, formatting the date/time prefix once per second"""
+        now = time.time()
+        second = int(now)
+        if second != self._timestamp_cache[0]:
+            self._timestamp_cache = (second, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second)))
+        return f"{self._timestamp_cache[1]}.{int((now - second) * 1e6):06d}"
+    
     async def _check_audio_alerts(self, device_id: str, session_id: str, result: Dict[str, Any]):
         """Check audio analysis results for alert conditions"""
         try:
@@ -180,9 +283,9 @@ class MLInferenceService:
                     "confidence": confidence,
                     "device_id": device_id,
                     "session_id": session_id,
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": self._alert_timestamp(),
                     "metadata": {
-                        "audio_features": result.get("spectral_features", {}),
+                        "audio_features": result.get("spectral_features") or {},
                         "model_used": result.get("model_used", "unknown"),
                         "inference_time_ms": result.get("inference_time_ms", 0)
                     }
@@ -213,7 +316,7 @@ class MLInferenceService:
                     "confidence": 0.8,
                     "device_id": device_id,
                     "session_id": session_id,
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": self._alert_timestamp(),
                     "metadata": {
                         "motion_features": result.get("motion_features", {}),
                         "detections": result.get("detections", []),
@@ -236,7 +339,7 @@ class MLInferenceService:
                     "confidence": 0.9,
                     "device_id": device_id,
                     "session_id": session_id,
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": self._alert_timestamp(),
                     "description": alert_msg,
                     "metadata": {
                         "detections": result.get("detections", []),
@@ -260,12 +363,12 @@ class MLInferenceService:
             start_time = time.time()
             
             if data_type == "audio":
-                result = await self.audio_service.detect_cry(data)
+                result = await self._detect_cry_cached(data, self.audio_service.detect_cry)
                 ML_INFERENCE_LATENCY.labels(model_type='audio').observe(time.time() - start_time)
                 return result
             
             elif data_type == "video":
-                result = await self.video_service.analyze_video_frame(data)
+                result = await self.video_service.analyze_video_frame(data, device_id)
                 ML_INFERENCE_LATENCY.labels(model_type='video').observe(time.time() - start_time)
                 return result
             
@@ -282,8 +385,10 @@ class MLInferenceService:
             return {}
         
         try:
-            audio_result = await self.redis_service.get_cached_ml_result(session_id, "audio")
-            video_result = await self.redis_service.get_cached_ml_result(session_id, "video")
+            audio_result, video_result = await self.redis_service.mget_cached_ml_result([
+                (session_id, "audio"),
+                (session_id, "video")
+            ])
             
             return {
                 "session_id": session_id,
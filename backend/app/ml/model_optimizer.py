@@ -1,19 +1,66 @@
 import torch
 import torch.nn as nn
 import onnx
+from onnx import helper, numpy_helper, TensorProto
 import onnxruntime as ort
+from onnxruntime.quantization import (
+    quantize_dynamic as quantize_onnx_dynamic,
+    quantize_static,
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType
+)
 from torch.quantization import quantize_dynamic
 import numpy as np
 import logging
+import time
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Iterable, Optional, Union
 import tempfile
-import os
+import copy
+import shutil
 
-from app.ml.audio_classifier import CryDetectionModel
+from app.ml.audio_classifier import CryDetectionModel, MFCCFrontend
+from app.ml.video_detector import VideoPreprocessor, yolo_providers, yolo_session_options
 
 logger = logging.getLogger(__name__)
 
+ONNX_OPTIMIZER_PASSES = [
+    'eliminate_deadend',
+    'eliminate_identity',
+    'eliminate_nop_transpose',
+    'eliminate_nop_pad',
+    'extract_constant_to_initializer',
+    'fuse_add_bias_into_conv',
+    'fuse_bn_into_conv',
+    'fuse_consecutive_concats',
+    'fuse_consecutive_transposes',
+    'fuse_matmul_add_bias_into_gemm',
+    'fuse_pad_into_conv',
+    'fuse_transpose_into_gemm'
+]
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Feed representative BGR frames, preprocessed as in serving, to ORT calibration"""
+    
+    def __init__(self, frames: Iterable[np.ndarray], onnx_path: str, preprocessor: Optional[VideoPreprocessor] = None):
+        self.frames = iter(frames)
+        self.preprocessor = preprocessor or VideoPreprocessor()
+        
+        # Models from ModelOptimizer.fold_image_preprocessing take raw uint8 NHWC frames
+        model_input = onnx.load(onnx_path, load_external_data=False).graph.input[0]
+        self.input_name = model_input.name
+        self.uint8_input = model_input.type.tensor_type.elem_type == TensorProto.UINT8
+    
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        frame = next(self.frames, None)
+        if frame is None:
+            return None
+        if self.uint8_input:
+            # The uint8 batch buffer is reused, so hand calibration its own copy
+            return {self.input_name: self.preprocessor.preprocess_frame_uint8(frame).copy()}
+        return {self.input_name: self.preprocessor.preprocess_frame(frame)}
+
 class ModelOptimizer:
     """Optimize PyTorch models for production deployment"""
     
@@ -61,6 +108,94 @@ class ModelOptimizer:
             logger.error(f"ONNX export failed: {e}")
             return False
     
+    def export_audio_model_to_onnx(
+        self,
+        model: CryDetectionModel,
+        output_path: str,
+        input_shape: tuple = (1, 13, 63),
+        opset_version: int = 17
+    ) -> bool:
+        """Export the cry detection model with BatchNorm folded and no Softmax"""
+        try:
+            model = copy.deepcopy(model).eval()
+            
+            # The ReLU module is shared with the FC layers, so only Conv+BN pairs are
+            # folded here; ORT fuses the following ReLUs at session load
+            torch.ao.quantization.fuse_modules(
+                model,
+                [['conv1', 'batch_norm1'], ['conv2', 'batch_norm2'], ['conv3', 'batch_norm3']],
+                inplace=True
+            )
+            
+            # The service derives the cry probability from the two logits
+            model.softmax = nn.Identity()
+            
+            # Trace in channels_last so the conv weights are laid out NHWC-friendly;
+            # the graph itself stays NCHW and ORT's layout transformer picks NHWC kernels
+            model = model.to(memory_format=torch.channels_last)
+            dummy_input = torch.randn(1, *input_shape).to(memory_format=torch.channels_last)
+            
+            torch.onnx.export(
+                model,
+                dummy_input,
+                output_path,
+                export_params=True,
+                opset_version=opset_version,
+                do_constant_folding=True,
+                input_names=['input'],
+                output_names=['logits'],
+                dynamic_axes={
+                    'input': {0: 'batch_size'},
+                    'logits': {0: 'batch_size'}
+                }
+            )
+            
+            onnx_model = onnx.load(output_path)
+            onnx.checker.check_model(onnx_model)
+            
+            logger.info(f"Audio model exported to ONNX: {output_path}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Audio model ONNX export failed: {e}")
+            return False
+    
+    def export_mfcc_to_onnx(
+        self,
+        output_path: str,
+        sample_rate: int = 16000,
+        n_mfcc: int = 13,
+        duration: float = 2.0,
+        opset_version: int = 13
+    ) -> bool:
+        """Export the MFCC front end as a standalone ONNX graph"""
+        try:
+            frontend = MFCCFrontend(sample_rate=sample_rate, n_mfcc=n_mfcc).eval()
+            
+            # Fixed window, so the classifier always sees (n_mfcc, frames)
+            dummy_input = torch.zeros(int(sample_rate * duration))
+            
+            torch.onnx.export(
+                frontend,
+                dummy_input,
+                output_path,
+                export_params=True,
+                opset_version=opset_version,
+                do_constant_folding=True,
+                input_names=['waveform'],
+                output_names=['mfcc']
+            )
+            
+            onnx_model = onnx.load(output_path)
+            onnx.checker.check_model(onnx_model)
+            
+            logger.info(f"MFCC front end exported to ONNX: {output_path}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"MFCC ONNX export failed: {e}")
+            return False
+    
     def quantize_model(
         self,
         model: nn.Module,
@@ -71,9 +206,11 @@ class ModelOptimizer:
             model.eval()
             
             if quantization_type == 'dynamic':
+                # Dynamic quantization only pays off for Linear layers; quantized Conv2d
+                # runs slower than FP32, so CNNs go through quantize_onnx_static instead
                 quantized_model = quantize_dynamic(
                     model,
-                    {nn.Linear, nn.Conv2d},
+                    {nn.Linear},
                     dtype=torch.qint8
                 )
             else:
@@ -87,20 +224,108 @@ class ModelOptimizer:
             logger.error(f"Quantization failed: {e}")
             return None
     
+    def quantize_onnx_model(self, onnx_path: str, quantized_path: Optional[str] = None) -> Optional[str]:
+        """Apply INT8 dynamic quantization to an exported ONNX model"""
+        try:
+            if quantized_path is None:
+                quantized_path = str(Path(onnx_path).with_suffix('.int8.onnx'))
+            
+            # Weights go to INT8 up front; activations are quantized per call,
+            # so CPU inference runs on ConvInteger/MatMulInteger (VNNI) kernels
+            quantize_onnx_dynamic(
+                onnx_path,
+                quantized_path,
+                weight_type=QuantType.QInt8
+            )
+            
+            logger.info(f"ONNX model quantized to INT8: {quantized_path}")
+            return quantized_path
+            
+        except Exception as e:
+            logger.error(f"ONNX quantization failed: {e}")
+            return None
+    
+    def quantize_onnx_static(
+        self,
+        onnx_path: str,
+        calibration_reader: CalibrationDataReader,
+        quantized_path: Optional[str] = None
+    ) -> Optional[str]:
+        """Apply INT8 static (QDQ) quantization to a CNN such as the YOLO detector"""
+        try:
+            if quantized_path is None:
+                quantized_path = str(Path(onnx_path).with_suffix('.int8.onnx'))
+            
+            # Activation ranges come from the calibration frames (~100 is enough),
+            # so convs run as QLinearConv on VNNI instead of quantizing per call
+            quantize_static(
+                onnx_path,
+                quantized_path,
+                calibration_reader,
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True
+            )
+            
+            logger.info(f"ONNX model statically quantized to INT8: {quantized_path}")
+            return quantized_path
+            
+        except Exception as e:
+            logger.error(f"ONNX static quantization failed: {e}")
+            return None
+    
+    def convert_to_fp16(self, onnx_path: str, fp16_path: Optional[str] = None) -> Optional[str]:
+        """Convert an ONNX model to FP16 for GPU serving, keeping float32 inputs/outputs"""
+        try:
+            from onnxconverter_common import float16
+            
+            if fp16_path is None:
+                fp16_path = str(Path(onnx_path).with_suffix('.fp16.onnx'))
+            
+            model = onnx.load(onnx_path)
+            
+            # NMS stays in float32 for stable box scores
+            fp16_model = float16.convert_float_to_float16(
+                model,
+                keep_io_types=True,
+                op_block_list=['NMS', 'NonMaxSuppression']
+            )
+            onnx.save(fp16_model, fp16_path)
+            
+            logger.info(f"ONNX model converted to FP16: {fp16_path}")
+            return fp16_path
+            
+        except ImportError:
+            logger.warning("onnxconverter-common not available, skipping FP16 conversion")
+            return None
+        except Exception as e:
+            logger.error(f"FP16 conversion failed: {e}")
+            return None
+    
     def optimize_onnx_model(self, onnx_path: str, optimized_path: str) -> bool:
         """Optimize ONNX model for inference"""
         try:
             import onnxoptimizer
+            from onnxruntime.tools.symbolic_shape_infer import SymbolicShapeInference
             
             # Load original model
             model = onnx.load(onnx_path)
             
             # Apply optimizations
-            optimized_model = onnxoptimizer.optimize(model)
+            optimized_model = onnxoptimizer.optimize(model, ONNX_OPTIMIZER_PASSES)
             
-            # Save optimized model
+            # Concrete shapes let the folding pass below resolve Shape/Reshape/Resize chains
+            optimized_model = SymbolicShapeInference.infer_shapes(optimized_model, auto_merge=True)
             onnx.save(optimized_model, optimized_path)
             
+            # Second pass: ORT's basic level (constant folding, redundant node elimination)
+            # is hardware-independent, so its output is safe to ship to any provider
+            so = ort.SessionOptions()
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_BASIC
+            so.optimized_model_filepath = optimized_path
+            ort.InferenceSession(optimized_path, sess_options=so, providers=['CPUExecutionProvider'])
+            
             logger.info(f"ONNX model optimized: {optimized_path}")
             return True
             
@@ -111,6 +336,57 @@ class ModelOptimizer:
             logger.error(f"ONNX optimization failed: {e}")
             return False
     
+    def fold_image_preprocessing(self, onnx_path: str, output_path: str) -> bool:
+        """Prepend uint8 NHWC -> float NCHW preprocessing to a detector's input"""
+        try:
+            model = onnx.load(onnx_path)
+            graph = model.graph
+            
+            # Original input is (N, 3, H, W) float; the new one is the raw (N, H, W, 3) frame
+            original_input = graph.input[0]
+            batch, channels, height, width = original_input.type.tensor_type.shape.dim
+            image_input = helper.make_tensor_value_info(
+                'image',
+                TensorProto.UINT8,
+                [d.dim_param or d.dim_value for d in (batch, height, width, channels)]
+            )
+            
+            # Same math as VideoPreprocessor.preprocess_frame: scale to [0, 1], then HWC -> CHW.
+            # The Transpose writes the old input name so existing consumers are untouched
+            graph.initializer.append(
+                numpy_helper.from_array(np.array(1 / 255.0, dtype=np.float32), 'preprocess_scale')
+            )
+            preprocess_nodes = [
+                helper.make_node('Cast', ['image'], ['image_float'], to=TensorProto.FLOAT),
+                helper.make_node('Mul', ['image_float', 'preprocess_scale'], ['image_scaled']),
+                helper.make_node('Transpose', ['image_scaled'], [original_input.name], perm=[0, 3, 1, 2])
+            ]
+            for index, node in enumerate(preprocess_nodes):
+                graph.node.insert(index, node)
+            
+            graph.input.remove(original_input)
+            graph.input.insert(0, image_input)
+            
+            onnx.checker.check_model(model)
+            
+            try:
+                import onnxoptimizer
+                model = onnxoptimizer.optimize(
+                    model,
+                    ['eliminate_identity', 'fuse_consecutive_transposes', 'fuse_bn_into_conv']
+                )
+            except ImportError:
+                logger.warning("onnxoptimizer not available, saving unoptimized graph")
+            
+            onnx.save(model, output_path)
+            
+            logger.info(f"Image preprocessing folded into ONNX model: {output_path}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Preprocessing fold failed: {e}")
+            return False
+    
     def benchmark_model(
         self,
         model_path: str,
@@ -119,29 +395,36 @@ class ModelOptimizer:
     ) -> Dict[str, float]:
         """Benchmark ONNX model performance"""
         try:
-            # Create ONNX Runtime session
-            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
-            session = ort.InferenceSession(model_path, providers=providers)
+            # Create ONNX Runtime session configured as in production
+            session = ort.InferenceSession(
+                model_path,
+                sess_options=yolo_session_options(),
+                providers=yolo_providers()
+            )
             
-            # Create dummy input
+            # Create dummy input, bound once so only inference is timed
             dummy_input = np.random.randn(1, *input_shape).astype(np.float32)
             input_name = session.get_inputs()[0].name
             
-            # Warmup runs
-            for _ in range(10):
-                session.run(None, {input_name: dummy_input})
+            binding = session.io_binding()
+            binding.bind_cpu_input(input_name, dummy_input)
+            for output in session.get_outputs():
+                binding.bind_output(output.name, 'cpu')
             
-            # Benchmark runs
-            import time
-            times = []
+            # Warmup runs, long enough for cuDNN algorithm search to settle
+            for _ in range(50):
+                session.run_with_iobinding(binding)
             
-            for _ in range(num_runs):
-                start_time = time.time()
-                session.run(None, {input_name: dummy_input})
-                end_time = time.time()
-                times.append(end_time - start_time)
+            # Benchmark runs; wait for outputs so GPU work is included in the timing
+            times = np.empty(num_runs, dtype=np.float64)
             
-            times = np.array(times)
+            for i in range(num_runs):
+                start_time = time.perf_counter_ns()
+                session.run_with_iobinding(binding)
+                binding.synchronize_outputs()
+                times[i] = time.perf_counter_ns() - start_time
+            
+            times /= 1e9
             
             benchmark_results = {
                 "avg_inference_time_ms": float(np.mean(times) * 1000),
@@ -211,19 +494,24 @@ class ModelOptimizer:
             except Exception as e:
                 logger.error(f"CoreML export failed: {e}")
             
-            # TensorFlow Lite export (via ONNX)
+            # TensorFlow Lite export, straight from PyTorch when ai-edge-torch is installed
             try:
-                # First export to ONNX
-                onnx_path = output_path / "temp_model.onnx"
-                if self.export_to_onnx(model, input_shape, str(onnx_path)):
-                    # Convert ONNX to TFLite
-                    tflite_path = output_path / "model.tflite"
-                    if self._convert_onnx_to_tflite(str(onnx_path), str(tflite_path)):
-                        results["tflite"] = True
-                        logger.info(f"TFLite model saved: {tflite_path}")
-                    
-                    # Clean up temp ONNX file
-                    onnx_path.unlink(missing_ok=True)
+                tflite_path = output_path / "model.tflite"
+                dummy_input = torch.randn(1, *input_shape)
+                converted = self._convert_torch_to_tflite(model, dummy_input, str(tflite_path))
+                
+                # Otherwise go through ONNX
+                if converted is None:
+                    onnx_path = output_path / "temp_model.onnx"
+                    if self.export_to_onnx(model, input_shape, str(onnx_path)):
+                        converted = self._convert_onnx_to_tflite(str(onnx_path), str(tflite_path))
+                        
+                        # Clean up temp ONNX file
+                        onnx_path.unlink(missing_ok=True)
+                
+                if converted:
+                    results["tflite"] = True
+                    logger.info(f"TFLite model saved: {tflite_path}")
                     
             except Exception as e:
                 logger.error(f"TFLite export failed: {e}")
@@ -234,37 +522,48 @@ class ModelOptimizer:
             logger.error(f"Mobile format export failed: {e}")
             return results
     
-    def _convert_onnx_to_tflite(self, onnx_path: str, tflite_path: str) -> bool:
-        """Convert ONNX model to TensorFlow Lite"""
+    def _convert_torch_to_tflite(self, model: nn.Module, dummy_input: torch.Tensor, tflite_path: str) -> Optional[bool]:
+        """Convert a PyTorch model to TensorFlow Lite with ai-edge-torch; None when it is not installed"""
         try:
-            import onnx
+            import ai_edge_torch
             import tensorflow as tf
-            from onnx_tf.backend import prepare
             
-            # Load ONNX model
-            onnx_model = onnx.load(onnx_path)
+            edge_model = ai_edge_torch.convert(
+                model,
+                (dummy_input,),
+                _ai_edge_converter_flags={"optimizations": [tf.lite.Optimize.DEFAULT]}
+            )
+            edge_model.export(tflite_path)
+            return True
             
-            # Convert to TensorFlow
-            tf_rep = prepare(onnx_model)
+        except ImportError:
+            logger.warning("ai-edge-torch not available, converting to TFLite via ONNX")
+            return None
+        except Exception as e:
+            logger.error(f"PyTorch to TFLite conversion failed: {e}")
+            return False
+    
+    def _convert_onnx_to_tflite(self, onnx_path: str, tflite_path: str) -> bool:
+        """Convert ONNX model to TensorFlow Lite with onnx2tf"""
+        try:
+            import onnx2tf
             
-            # Export to TensorFlow SavedModel format
+            # onnx2tf writes TFLite files directly, without a SavedModel round-trip
             with tempfile.TemporaryDirectory() as temp_dir:
-                saved_model_path = os.path.join(temp_dir, "saved_model")
-                tf_rep.export_graph(saved_model_path)
-                
-                # Convert to TensorFlow Lite
-                converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_path)
-                converter.optimizations = [tf.lite.Optimize.DEFAULT]
-                tflite_model = converter.convert()
+                onnx2tf.convert(
+                    input_onnx_file_path=onnx_path,
+                    output_folder_path=temp_dir,
+                    output_dynamic_range_quantized_tflite=True,
+                    non_verbose=True
+                )
                 
-                # Save TFLite model
-                with open(tflite_path, 'wb') as f:
-                    f.write(tflite_model)
+                converted = next(Path(temp_dir).glob("*_dynamic_range_quant.tflite"))
+                shutil.move(str(converted), tflite_path)
             
             return True
             
         except ImportError:
-            logger.warning("TensorFlow or ONNX-TF not available for TFLite conversion")
+            logger.warning("onnx2tf not available for TFLite conversion")
             return False
         except Exception as e:
             logger.error(f"ONNX to TFLite conversion failed: {e}")
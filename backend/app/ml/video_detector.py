@@ -1,73 +1,164 @@
+import asyncio
 import cv2
 import numpy as np
 import onnxruntime as ort
+import psutil
 from typing import Dict, Any, Optional, List, Tuple
 import logging
+import struct
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import torch
-import torchvision.transforms as transforms
 
-from app.core.config import settings
+from app.core.config import settings, prefer_int8
 
 logger = logging.getLogger(__name__)
 
+# Frame micro-batching: one YOLO run per this many frames or this long a wait
+VIDEO_BATCH_MAX_SIZE = 8
+VIDEO_BATCH_WINDOW_SECONDS = 0.005
+
+# Static-scene gating: below this mean frame difference (0-255) the previous detections
+# are reused, refreshed at least every N frames or once they are this old
+STATIC_MOTION_THRESHOLD = 2.0
+DETECTION_REFRESH_FRAMES = 30
+DETECTION_CACHE_TTL_SECONDS = 1.0
+
+# Per-stream motion and detection state is dropped after this long without a frame
+STREAM_STATE_TTL_SECONDS = 300.0
+
+# Frame difference above which a pixel counts as moving
+MOTION_PIXEL_THRESHOLD = 30
+DIFF_LEVELS = np.arange(256, dtype=np.float64)
+
+# Person boxes smaller than this (pixels, 30% of a 640x640 frame) are likely a baby
+BABY_MAX_AREA = 0.3 * 640 * 640
+
+DANGEROUS_OBJECTS = frozenset({"knife", "scissors", "fire hydrant", "car", "truck"})
+
+# JPEG decode reductions (libjpeg scales during IDCT), largest first
+JPEG_REDUCED_DECODE = ((4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+YOLO_PROVIDERS = [
+    ("CUDAExecutionProvider", {
+        "device_id": 0,
+        "arena_extend_strategy": "kNextPowerOfTwo",
+        "cudnn_conv_algo_search": "DEFAULT",
+        "do_copy_in_default_stream": True
+    }),
+    "CPUExecutionProvider"
+]
+
+def yolo_providers() -> List[Any]:
+    """YOLO execution providers, with TensorRT first when enabled"""
+    if not settings.VIDEO_USE_TENSORRT:
+        return YOLO_PROVIDERS
+    
+    # Built engines are cached on disk so only the first start pays the build
+    return [
+        ("TensorrtExecutionProvider", {
+            "device_id": 0,
+            "trt_engine_cache_enable": True,
+            "trt_engine_cache_path": settings.TRT_CACHE_DIR,
+            "trt_fp16_enable": True,
+            "trt_max_workspace_size": 4 << 30
+        }),
+        *YOLO_PROVIDERS
+    ]
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from a JPEG start-of-frame header without decoding"""
+    if data[:2] != b"\xff\xd8":
+        return None
+    
+    i, size = 2, len(data)
+    while i + 9 < size:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # Fill byte
+            i += 1
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    
+    return None
+
+def yolo_session_options() -> ort.SessionOptions:
+    """Session options for the YOLO detector; the graph is re-optimized at each load"""
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    so.intra_op_num_threads = psutil.cpu_count(logical=False) or 1
+    return so
+
 class VideoPreprocessor:
     """Video preprocessing for object detection and motion analysis"""
     
-    def __init__(self, target_size: Tuple[int, int] = (640, 640)):
+    def __init__(self, target_size: Tuple[int, int] = (640, 640), motion_size: Tuple[int, int] = (160, 120)):
         self.target_size = target_size
-        self.transforms = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.Resize(target_size),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        self.motion_size = motion_size
+        
+        # Reused output buffers for the uint8 path (cv2 sizes are (width, height))
+        width, height = target_size
+        self._resized = np.empty((height, width, 3), dtype=np.uint8)
+        self._batch_u8 = np.empty((1, height, width, 3), dtype=np.uint8)
+        
+        # Motion statistics run on small grayscale frames with reused buffers
+        motion_width, motion_height = motion_size
+        self._motion_color = np.empty((motion_height, motion_width, 3), dtype=np.uint8)
+        self._frame_diff = np.empty((motion_height, motion_width), dtype=np.uint8)
+        self._edges = np.empty((motion_height, motion_width), dtype=np.uint8)
     
     def preprocess_frame(self, frame: np.ndarray) -> np.ndarray:
         """Preprocess single frame for YOLO inference"""
         try:
-            # Convert BGR to RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Resize and normalize
-            frame_resized = cv2.resize(frame_rgb, self.target_size)
-            frame_normalized = frame_resized.astype(np.float32) / 255.0
-            
-            # Convert to NCHW format
-            frame_tensor = np.transpose(frame_normalized, (2, 0, 1))
-            frame_batch = np.expand_dims(frame_tensor, axis=0)
-            
-            return frame_batch
+            # Resize, BGR->RGB, scale to [0, 1] and NCHW layout in one pass
+            return cv2.dnn.blobFromImage(
+                frame,
+                scalefactor=1 / 255.0,
+                size=self.target_size,
+                mean=(0, 0, 0),
+                swapRB=True,
+                crop=False
+            )
             
         except Exception as e:
             logger.error(f"Frame preprocessing failed: {e}")
             return np.zeros((1, 3, *self.target_size), dtype=np.float32)
     
-    def extract_motion_features(self, current_frame: np.ndarray, previous_frame: np.ndarray) -> Dict[str, float]:
-        """Extract motion-based features"""
+    def to_motion_gray(self, frame: np.ndarray, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Area-downsample a BGR frame to motion_size and convert it to grayscale"""
+        cv2.resize(frame, self.motion_size, dst=self._motion_color, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(self._motion_color, cv2.COLOR_BGR2GRAY, dst=dst)
+    
+    def preprocess_frame_uint8(self, frame: np.ndarray) -> np.ndarray:
+        """Resize and BGR->RGB into a reused (1, H, W, 3) uint8 batch.
+        
+        For models with scaling and the NCHW transpose folded into the graph; the
+        returned buffer is overwritten by the next call.
+        """
+        cv2.resize(frame, self.target_size, dst=self._resized)
+        cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._batch_u8[0])
+        return self._batch_u8
+    
+    def extract_motion_features(self, current_gray: np.ndarray, previous_gray: np.ndarray) -> Dict[str, float]:
+        """Extract motion-based features from two to_motion_gray frames"""
         try:
-            # Convert to grayscale
-            current_gray = cv2.cvtColor(current_frame, cv2.COLOR_BGR2GRAY)
-            previous_gray = cv2.cvtColor(previous_frame, cv2.COLOR_BGR2GRAY)
-            
-            # Calculate optical flow
-            flow = cv2.calcOpticalFlowPyrLK(
-                previous_gray, current_gray, None, None
-            )
-            
-            # Motion magnitude
-            frame_diff = cv2.absdiff(current_gray, previous_gray)
-            motion_magnitude = np.mean(frame_diff)
-            
-            # Motion vectors
-            motion_pixels = np.sum(frame_diff > 30)  # Threshold for motion
+            frame_diff = cv2.absdiff(current_gray, previous_gray, dst=self._frame_diff)
             total_pixels = frame_diff.size
-            motion_ratio = motion_pixels / total_pixels
+            
+            # One histogram pass gives both the mean difference and the moving-pixel count
+            hist = cv2.calcHist([frame_diff], [0], None, [256], [0, 256]).ravel()
+            motion_magnitude = hist @ DIFF_LEVELS / total_pixels
+            motion_ratio = hist[MOTION_PIXEL_THRESHOLD + 1:].sum() / total_pixels
             
             # Edge detection for activity level
-            edges = cv2.Canny(current_gray, 50, 150)
-            edge_density = np.sum(edges > 0) / edges.size
+            edges = cv2.Canny(current_gray, 50, 150, edges=self._edges)
+            edge_density = cv2.countNonZero(edges) / edges.size
             
             return {
                 "motion_magnitude": float(motion_magnitude),
@@ -88,8 +179,17 @@ class VideoPreprocessor:
 class YOLODetector:
     """YOLOv8-based object detection for baby monitoring"""
     
-    def __init__(self):
+    def __init__(self, preprocessor: Optional[VideoPreprocessor] = None):
+        self.preprocessor = preprocessor or VideoPreprocessor()
         self.onnx_session: Optional[ort.InferenceSession] = None
+        self.input_name: Optional[str] = None
+        self.output_name: Optional[str] = None
+        self.uint8_input = False
+        self.io_binding: Optional[ort.IOBinding] = None
+        self.input_device = "cpu"
+        self.input_values: Dict[int, ort.OrtValue] = {}
+        self.max_batch_size = 1
+        self.model_path: Optional[str] = None
         self.model_loaded = False
         self.class_names = [
             'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck',
@@ -105,137 +205,363 @@ class YOLODetector:
             'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear', 'hair drier',
             'toothbrush'
         ]
+        # Name lookup by class id for a whole array of ids; ids past the list map to "unknown"
+        self.class_name_table = np.array(self.class_names + ["unknown"], dtype=object)
         self._load_model()
     
     def _load_model(self):
         """Load YOLO ONNX model"""
         try:
-            model_path = Path(settings.VIDEO_MODEL_PATH)
+            # A quantized build next to the configured model is used when present
+            model_path = prefer_int8(settings.VIDEO_MODEL_PATH)
+            
+            # On GPU prefer the FP16 build; its inputs and outputs stay float32
+            fp16_path = Path(settings.VIDEO_MODEL_FP16_PATH)
+            if fp16_path.exists() and "CUDAExecutionProvider" in ort.get_available_providers():
+                model_path = fp16_path
+            
             if not model_path.exists():
                 logger.warning(f"Video model not found at {model_path}")
                 return
             
-            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
             self.onnx_session = ort.InferenceSession(
                 str(model_path),
-                providers=providers
+                sess_options=yolo_session_options(),
+                providers=yolo_providers()
             )
             
+            # Models from ModelOptimizer.fold_image_preprocessing take raw uint8 NHWC frames
+            model_input = self.onnx_session.get_inputs()[0]
+            self.input_name = model_input.name
+            self.output_name = self.onnx_session.get_outputs()[0].name
+            self.uint8_input = model_input.type == 'tensor(uint8)'
+            
+            # A symbolic batch dim (dynamic_axes at export) allows multi-frame runs
+            batch_dim = model_input.shape[0]
+            self.max_batch_size = batch_dim if isinstance(batch_dim, int) else VIDEO_BATCH_MAX_SIZE
+            
+            active_providers = self.onnx_session.get_providers()
+            if "TensorrtExecutionProvider" in active_providers or "CUDAExecutionProvider" in active_providers:
+                self.input_device = "cuda"
+            
+            self.io_binding = self.onnx_session.io_binding()
+            self.io_binding.bind_output(self.output_name, "cpu")
+            
+            self.model_path = str(model_path)
             self.model_loaded = True
-            logger.info("YOLO ONNX model loaded successfully")
+            logger.info(f"YOLO ONNX model loaded successfully from {model_path}")
             
         except Exception as e:
             logger.error(f"Failed to load YOLO model: {e}")
             self.model_loaded = False
     
+    def _input_value(self, batch_size: int) -> ort.OrtValue:
+        """Persistent model input on the session's device for a batch size.
+        
+        Refilled in place each run, so ORT doesn't allocate and stage a fresh copy
+        of the frames per call.
+        """
+        value = self.input_values.get(batch_size)
+        if value is None:
+            width, height = self.preprocessor.target_size
+            if self.uint8_input:
+                shape, element_type = [batch_size, height, width, 3], np.uint8
+            else:
+                shape, element_type = [batch_size, 3, height, width], np.float32
+            value = ort.OrtValue.ortvalue_from_shape_and_type(shape, element_type, self.input_device, 0)
+            self.input_values[batch_size] = value
+        return value
+    
     def detect_objects(self, frame: np.ndarray) -> List[Dict[str, Any]]:
         """Run object detection on frame"""
+        return self.detect_objects_batch([frame])[0]
+    
+    def detect_objects_batch(self, frames: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """Run object detection on several frames with one model run"""
         if not self.model_loaded or not self.onnx_session:
-            return []
+            return [[] for _ in frames]
         
         try:
-            # Preprocess frame
-            preprocessor = VideoPreprocessor()
-            input_tensor = preprocessor.preprocess_frame(frame)
+            # Preprocess each frame into its slot of the batch
+            batch = None
+            for i, frame in enumerate(frames):
+                if self.uint8_input:
+                    input_tensor = self.preprocessor.preprocess_frame_uint8(frame)
+                else:
+                    input_tensor = self.preprocessor.preprocess_frame(frame)
+                if batch is None:
+                    batch = np.empty((len(frames), *input_tensor.shape[1:]), dtype=input_tensor.dtype)
+                batch[i] = input_tensor[0]
             
             # Run inference
-            input_name = self.onnx_session.get_inputs()[0].name
-            outputs = self.onnx_session.run(None, {input_name: input_tensor})
-            
-            # Post-process detections
-            detections = self._postprocess_detections(outputs[0], frame.shape)
-            
-            return detections
+            input_value = self._input_value(len(frames))
+            input_value.update_inplace(batch)
+            self.io_binding.bind_ortvalue_input(self.input_name, input_value)
+            self.onnx_session.run_with_iobinding(self.io_binding)
+            raw_output = self.io_binding.copy_outputs_to_cpu()[0]
+            
+            # Post-process detections per frame
+            return [
+                self._postprocess_detections(raw_output[i:i + 1], frame.shape)
+                for i, frame in enumerate(frames)
+            ]
             
         except Exception as e:
             logger.error(f"Object detection failed: {e}")
-            return []
+            return [[] for _ in frames]
     
     def _postprocess_detections(self, raw_output: np.ndarray, frame_shape: Tuple[int, int, int]) -> List[Dict[str, Any]]:
         """Post-process YOLO output"""
         try:
-            detections = []
             h, w = frame_shape[:2]
             
             # YOLO output format: [batch, num_detections, 85] where 85 = 4 bbox + 1 conf + 80 classes
-            for detection in raw_output[0]:
-                confidence = detection[4]
-                
-                if confidence > 0.5:  # Confidence threshold
-                    # Get class with highest score
-                    class_scores = detection[5:]
-                    class_id = np.argmax(class_scores)
-                    class_confidence = class_scores[class_id]
-                    
-                    if class_confidence > 0.3:
-                        # Convert normalized coordinates to pixel coordinates
-                        cx, cy, width, height = detection[:4]
-                        x1 = int((cx - width/2) * w)
-                        y1 = int((cy - height/2) * h)
-                        x2 = int((cx + width/2) * w)
-                        y2 = int((cy + height/2) * h)
-                        
-                        detections.append({
-                            "class_id": int(class_id),
-                            "class_name": self.class_names[class_id] if class_id < len(self.class_names) else "unknown",
-                            "confidence": float(confidence),
-                            "bbox": [x1, y1, x2, y2],
-                            "center": [int(cx * w), int(cy * h)],
-                            "area": int(width * w * height * h)
-                        })
-            
-            return detections
+            candidates = raw_output[0]
+            candidates = candidates[candidates[:, 4] > 0.5]  # Confidence threshold
+            
+            # Class with highest score for every remaining box at once
+            class_scores = candidates[:, 5:]
+            class_ids = class_scores.argmax(axis=1)
+            class_confidence = class_scores[np.arange(len(candidates)), class_ids]
+            
+            keep = class_confidence > 0.3
+            candidates, class_ids = candidates[keep], class_ids[keep]
+            if len(candidates) == 0:
+                return []
+            
+            # Convert normalized coordinates to pixel coordinates
+            cx, cy, width, height = candidates[:, :4].T
+            x1 = ((cx - width / 2) * w).astype(int)
+            y1 = ((cy - height / 2) * h).astype(int)
+            x2 = ((cx + width / 2) * w).astype(int)
+            y2 = ((cy + height / 2) * h).astype(int)
+            confidence = candidates[:, 4]
+            
+            # Drop overlapping boxes for the same object; suppression is per class, so a
+            # knife held by a person survives next to the higher-scoring person box
+            keep = cv2.dnn.NMSBoxesBatched(
+                np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).tolist(),
+                confidence.tolist(),
+                class_ids.tolist(),
+                0.5,
+                0.45
+            )
+            
+            kept = np.asarray(keep, dtype=int).reshape(-1)
+            kept_ids = class_ids[kept]
+            kept_names = self.class_name_table[np.minimum(kept_ids, len(self.class_names))]
+            
+            return [
+                {
+                    "class_id": class_id,
+                    "class_name": class_name,
+                    "confidence": score,
+                    "bbox": bbox,
+                    "center": center,
+                    "area": area
+                }
+                for class_id, class_name, score, bbox, center, area in zip(
+                    kept_ids.tolist(),
+                    kept_names.tolist(),
+                    confidence[kept].tolist(),
+                    np.stack([x1, y1, x2, y2], axis=1)[kept].tolist(),
+                    np.stack([cx * w, cy * h], axis=1)[kept].astype(int).tolist(),
+                    (width * w * height * h)[kept].astype(int).tolist()
+                )
+            ]
             
         except Exception as e:
             logger.error(f"Post-processing failed: {e}")
             return []
 
+class VideoStreamState:
+    """Motion and detection state for a single camera stream"""
+    
+    def __init__(self, motion_size: Tuple[int, int]):
+        self.previous_gray: Optional[np.ndarray] = None
+        self.frame_count = 0
+        
+        # Two grayscale motion buffers, alternating between current and previous
+        motion_width, motion_height = motion_size
+        self.gray_buffers = [np.empty((motion_height, motion_width), dtype=np.uint8) for _ in range(2)]
+        
+        self.last_detections: List[Dict[str, Any]] = []
+        self.last_detection_time = 0.0
+        self.last_seen = time.time()
+
 class VideoInferenceService:
     """Complete video inference service for baby monitoring"""
     
     def __init__(self):
-        self.yolo_detector = YOLODetector()
         self.preprocessor = VideoPreprocessor()
-        self.previous_frame: Optional[np.ndarray] = None
+        self.yolo_detector = YOLODetector(self.preprocessor)
         self.frame_count = 0
+        
+        # Frame-to-frame state per device, so streams never compare against each other
+        self._streams: Dict[str, VideoStreamState] = {}
+        self._last_stream_sweep = time.time()
+        
+        # JPEG decode runs off the event loop on all cores; the motion step keeps
+        # state between frames, so it gets a single thread and stays in order
+        self._pool = ThreadPoolExecutor(
+            max_workers=psutil.cpu_count(logical=False) or 1,
+            thread_name_prefix="video-decode"
+        )
+        self._motion_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="video-motion")
+        
+        # Frames from concurrent streams are coalesced into YOLO batches
+        self._detection_queue: Optional[asyncio.Queue] = None
+        self._detection_task: Optional[asyncio.Task] = None
+    
+    def _stream_state(self, stream_id: str) -> VideoStreamState:
+        """Get the state for a stream, dropping streams that have gone quiet"""
+        now = time.time()
+        if now - self._last_stream_sweep > STREAM_STATE_TTL_SECONDS:
+            self._streams = {
+                key: state for key, state in self._streams.items()
+                if now - state.last_seen <= STREAM_STATE_TTL_SECONDS
+            }
+            self._last_stream_sweep = now
+        
+        state = self._streams.get(stream_id)
+        if state is None:
+            state = self._streams[stream_id] = VideoStreamState(self.preprocessor.motion_size)
+        state.last_seen = now
+        return state
+    
+    def _decode_frame(self, frame_data: bytes) -> Tuple[Optional[np.ndarray], int, Optional[Tuple[int, int]]]:
+        """Decode a frame, shrinking large JPEGs during decode when YOLO would downscale them anyway"""
+        nparr = np.frombuffer(frame_data, np.uint8)
+        
+        dimensions = jpeg_dimensions(frame_data)
+        if dimensions is not None:
+            width, height = dimensions
+            target_width, target_height = self.preprocessor.target_size
+            for factor, flag in JPEG_REDUCED_DECODE:
+                # Both axes must stay at or above the model input, or the resize would upsample one
+                if width // factor >= target_width and height // factor >= target_height:
+                    return cv2.imdecode(nparr, flag), factor, dimensions
+        
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR), 1, dimensions
+    
+    def _motion_step(self, state: VideoStreamState, frame: np.ndarray) -> Tuple[int, Dict[str, float]]:
+        """Number the frame and compare it against the stream's previous one"""
+        self.frame_count += 1
+        state.frame_count += 1
+        
+        motion_features = {}
+        spare_gray = state.gray_buffers[1] if state.previous_gray is state.gray_buffers[0] else state.gray_buffers[0]
+        current_gray = self.preprocessor.to_motion_gray(frame, spare_gray)
+        if state.previous_gray is not None:
+            motion_features = self.preprocessor.extract_motion_features(current_gray, state.previous_gray)
+        
+        # Keep only the small grayscale for the next iteration
+        state.previous_gray = current_gray
+        
+        return state.frame_count, motion_features
     
-    async def analyze_video_frame(self, frame_data: bytes) -> Dict[str, Any]:
+    @staticmethod
+    def _scale_detections(detections: List[Dict[str, Any]], factor: int) -> List[Dict[str, Any]]:
+        """Map detections from a reduced decode back to source frame pixels"""
+        return [
+            {
+                **detection,
+                "bbox": [v * factor for v in detection["bbox"]],
+                "center": [v * factor for v in detection["center"]],
+                "area": detection["area"] * factor * factor
+            }
+            for detection in detections
+        ]
+    
+    async def _detect_objects_batched(self, frame: np.ndarray) -> List[Dict[str, Any]]:
+        """Queue a frame for the next YOLO batch and wait for its detections"""
+        if self._detection_task is None:
+            self._detection_queue = asyncio.Queue()
+            self._detection_task = asyncio.create_task(self._detection_batch_loop())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._detection_queue.put((frame, future))
+        return await future
+    
+    async def _detection_batch_loop(self):
+        """Collect queued frames into batches and run them through YOLO"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch: List[Tuple[np.ndarray, asyncio.Future]] = [await self._detection_queue.get()]
+            deadline = loop.time() + VIDEO_BATCH_WINDOW_SECONDS
+            
+            while len(batch) < min(VIDEO_BATCH_MAX_SIZE, self.yolo_detector.max_batch_size):
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._detection_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # One batch at a time, so the detector's binding and buffers are never shared
+            try:
+                results = await asyncio.to_thread(
+                    self.yolo_detector.detect_objects_batch, [frame for frame, _ in batch]
+                )
+                for (_, future), detections in zip(batch, results):
+                    if not future.done():
+                        future.set_result(detections)
+            except Exception as e:
+                logger.error(f"Detection batch failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    async def analyze_video_frame(self, frame_data: bytes, stream_id: str = "default") -> Dict[str, Any]:
         """Main video analysis function"""
         start_time = time.time()
         
         try:
+            loop = asyncio.get_running_loop()
+            state = self._stream_state(stream_id)
+            
             # Convert bytes to OpenCV frame
-            nparr = np.frombuffer(frame_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            frame, decode_factor, dimensions = await loop.run_in_executor(self._pool, self._decode_frame, frame_data)
             
             if frame is None:
                 raise ValueError("Invalid frame data")
             
-            self.frame_count += 1
+            frame_shape = (dimensions[1], dimensions[0], frame.shape[2]) if decode_factor > 1 else frame.shape
             
-            # Object detection
-            detections = self.yolo_detector.detect_objects(frame)
+            # Motion analysis on its own thread so the grayscale buffers are never
+            # touched by two frames at once
+            frame_number, motion_features = await loop.run_in_executor(self._motion_pool, self._motion_step, state, frame)
             
-            # Motion analysis
-            motion_features = {}
-            if self.previous_frame is not None:
-                motion_features = self.preprocessor.extract_motion_features(frame, self.previous_frame)
+            # Object detection, skipped while the scene is static and the last result is fresh
+            scene_static = (
+                motion_features
+                and motion_features["motion_magnitude"] < STATIC_MOTION_THRESHOLD
+                and frame_number % DETECTION_REFRESH_FRAMES != 0
+                and time.time() - state.last_detection_time < DETECTION_CACHE_TTL_SECONDS
+            )
+            if scene_static:
+                detections = state.last_detections
+            else:
+                detections = await self._detect_objects_batched(frame)
+                if decode_factor > 1:
+                    detections = self._scale_detections(detections, decode_factor)
+                state.last_detections = detections
+                state.last_detection_time = time.time()
             
             # Analyze detections for baby monitoring
             analysis = self._analyze_detections(detections, motion_features)
             
-            # Store current frame for next iteration
-            self.previous_frame = frame.copy()
-            
             inference_time = time.time() - start_time
             
             result = {
-                "frame_number": self.frame_count,
+                "frame_number": frame_number,
                 "detections": detections,
                 "motion_features": motion_features,
                 "analysis": analysis,
                 "inference_time_ms": inference_time * 1000,
-                "frame_shape": frame.shape,
+                "frame_shape": frame_shape,
                 "model_used": "yolo" if self.yolo_detector.model_loaded else "basic"
             }
             
@@ -254,54 +580,52 @@ class VideoInferenceService:
     def _analyze_detections(self, detections: List[Dict], motion_features: Dict) -> Dict[str, Any]:
         """Analyze detections for baby monitoring context"""
         try:
-            analysis = {
-                "person_detected": False,
-                "baby_likely": False,
-                "activity_level": "low",
-                "safety_alerts": [],
-                "object_summary": {}
-            }
-            
-            # Count object types
-            object_counts = {}
-            for detection in detections:
-                class_name = detection["class_name"]
-                object_counts[class_name] = object_counts.get(class_name, 0) + 1
-            
-            analysis["object_summary"] = object_counts
-            
-            # Person detection analysis
-            persons = [d for d in detections if d["class_name"] == "person"]
-            if persons:
-                analysis["person_detected"] = True
-                
-                # Heuristic for baby detection (small person objects)
-                for person in persons:
-                    area_ratio = person["area"] / (640 * 640)  # Normalized area
-                    if area_ratio < 0.3:  # Small person likely a baby
-                        analysis["baby_likely"] = True
-                        break
-            
             # Activity level based on motion
             motion_score = motion_features.get("activity_score", 0)
             if motion_score > 0.1:
-                analysis["activity_level"] = "high"
+                activity_level = "high"
             elif motion_score > 0.05:
-                analysis["activity_level"] = "medium"
+                activity_level = "medium"
             else:
-                analysis["activity_level"] = "low"
+                activity_level = "low"
+            
+            # Idle frames have nothing to count
+            if not detections:
+                return {
+                    "person_detected": False,
+                    "baby_likely": False,
+                    "activity_level": activity_level,
+                    "safety_alerts": ["High activity level detected"] if motion_score > 0.15 else [],
+                    "object_summary": {}
+                }
+            
+            # Count object types
+            object_counts = dict(Counter(d["class_name"] for d in detections))
+            
+            # Person detection analysis, with small person boxes as the baby heuristic
+            person_detected = "person" in object_counts
+            baby_likely = person_detected and any(
+                d["area"] < BABY_MAX_AREA for d in detections if d["class_name"] == "person"
+            )
             
-            # Safety alerts
-            dangerous_objects = ["knife", "scissors", "fire hydrant", "car", "truck"]
-            for obj_name in object_counts:
-                if obj_name in dangerous_objects:
-                    analysis["safety_alerts"].append(f"Potentially dangerous object detected: {obj_name}")
+            # Safety alerts, in detection order
+            safety_alerts = [
+                f"Potentially dangerous object detected: {obj_name}"
+                for obj_name in object_counts
+                if obj_name in DANGEROUS_OBJECTS
+            ]
             
             # High activity alert
             if motion_score > 0.15:
-                analysis["safety_alerts"].append("High activity level detected")
+                safety_alerts.append("High activity level detected")
             
-            return analysis
+            return {
+                "person_detected": person_detected,
+                "baby_likely": baby_likely,
+                "activity_level": activity_level,
+                "safety_alerts": safety_alerts,
+                "object_summary": object_counts
+            }
             
         except Exception as e:
             logger.error(f"Detection analysis failed: {e}")
@@ -311,7 +635,8 @@ class VideoInferenceService:
         """Get model information"""
         return {
             "yolo_model_loaded": self.yolo_detector.model_loaded,
-            "model_path": settings.VIDEO_MODEL_PATH,
+            "model_path": self.yolo_detector.model_path or settings.VIDEO_MODEL_PATH,
             "supported_classes": len(self.yolo_detector.class_names),
-            "frames_processed": self.frame_count
+            "frames_processed": self.frame_count,
+            "active_streams": len(self._streams)
         }
@@ -1,26 +1,49 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Text, JSON
+from typing import TYPE_CHECKING, Optional
+from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey, Float, Text, JSON, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 
+if TYPE_CHECKING:
+    from .device import Device
+    from .user import User
+
 class Alert(Base):
     __tablename__ = "alerts"
     
-    id = Column(Integer, primary_key=True, index=True)
-    alert_type = Column(String, nullable=False)  # cry_detected, motion_detected, sound_anomaly
-    severity = Column(String, default="medium")  # low, medium, high, critical
-    confidence_score = Column(Float, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
-    is_acknowledged = Column(Boolean, default=False)
-    acknowledged_at = Column(DateTime(timezone=True))
-    description = Column(Text)
-    metadata = Column(JSON)  # Store ML model outputs, audio features, etc.
-    s3_audio_url = Column(String)
-    s3_video_url = Column(String)
-    duration_seconds = Column(Float)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    alert_type: Mapped[str] = mapped_column(String, nullable=False)  # cry_detected, motion_detected, sound_anomaly
+    severity: Mapped[Optional[str]] = mapped_column(String, default="medium")  # low, medium, high, critical
+    confidence_score: Mapped[float] = mapped_column(Float, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    device_id: Mapped[int] = mapped_column(Integer, ForeignKey("devices.id"), nullable=False)
+    is_acknowledged: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
+    acknowledged_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    description: Mapped[Optional[str]] = mapped_column(Text)
+    # "metadata" is reserved on declarative classes; the DB column keeps the name
+    meta: Mapped[Optional[dict]] = mapped_column("metadata", JSON)  # Store ML model outputs, audio features, etc.
+    s3_audio_url: Mapped[Optional[str]] = mapped_column(String)
+    s3_video_url: Mapped[Optional[str]] = mapped_column(String)
+    duration_seconds: Mapped[Optional[float]] = mapped_column(Float)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    user = relationship("User", back_populates="alerts")
-    device = relationship("Device", back_populates="alerts")
+    user: Mapped["User"] = relationship(back_populates="alerts", lazy="raise")
+    device: Mapped["Device"] = relationship(back_populates="alerts", lazy="raise")
+    
+    __table_args__ = (
+        # Window scans for the alert list and stats endpoints
+        Index("ix_alerts_user_created", "user_id", created_at.desc(), id.desc()),
+        # Lets get_alert_stats aggregate from an index-only scan
+        Index(
+            "ix_alerts_user_created_stats",
+            "user_id",
+            created_at.desc(),
+            postgresql_include=["severity", "alert_type", "is_acknowledged", "confidence_score"]
+        ),
+        # Unacknowledged alerts per device
+        Index("ix_alerts_device_ack", "device_id", "is_acknowledged"),
+    )
+    # Fetch server defaults (created_at) in the INSERT instead of a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
@@ -1,26 +1,35 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float
+from typing import TYPE_CHECKING, List, Optional
+from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, Boolean, ForeignKey, Float
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 
+if TYPE_CHECKING:
+    from .alert import Alert
+    from .stream_session import StreamSession
+    from .user import User
+
 class Device(Base):
     __tablename__ = "devices"
     
-    id = Column(Integer, primary_key=True, index=True)
-    device_id = Column(String, unique=True, index=True, nullable=False)
-    name = Column(String, nullable=False)
-    device_type = Column(String, default="mobile")  # mobile, camera, sensor
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    is_active = Column(Boolean, default=True)
-    last_seen = Column(DateTime(timezone=True))
-    firmware_version = Column(String)
-    battery_level = Column(Float)
-    location_lat = Column(Float)
-    location_lng = Column(Float)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    device_id: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    device_type: Mapped[Optional[str]] = mapped_column(String, default="mobile")  # mobile, camera, sensor
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+    last_seen: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    firmware_version: Mapped[Optional[str]] = mapped_column(String)
+    battery_level: Mapped[Optional[float]] = mapped_column(Float)
+    location_lat: Mapped[Optional[float]] = mapped_column(Float)
+    location_lng: Mapped[Optional[float]] = mapped_column(Float)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
-    owner = relationship("User", back_populates="devices")
-    stream_sessions = relationship("StreamSession", back_populates="device")
-    alerts = relationship("Alert", back_populates="device")
+    owner: Mapped["User"] = relationship(back_populates="devices", lazy="raise")
+    stream_sessions: Mapped[List["StreamSession"]] = relationship(back_populates="device", lazy="raise")
+    alerts: Mapped[List["Alert"]] = relationship(back_populates="device", lazy="raise")
+    
+    __mapper_args__ = {"eager_defaults": True}
@@ -1,23 +1,36 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, JSON
+from typing import TYPE_CHECKING, Optional
+from datetime import datetime
+from sqlalchemy import Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Float, JSON, Index
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 
+if TYPE_CHECKING:
+    from .device import Device
+
 class StreamSession(Base):
     __tablename__ = "stream_sessions"
     
-    id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, unique=True, index=True, nullable=False)
-    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
-    started_at = Column(DateTime(timezone=True), server_default=func.now())
-    ended_at = Column(DateTime(timezone=True))
-    duration_seconds = Column(Float)
-    total_bytes_received = Column(Integer, default=0)
-    avg_bitrate_kbps = Column(Float)
-    connection_quality = Column(String)  # excellent, good, fair, poor
-    disconnect_reason = Column(String)
-    metadata = Column(JSON)  # Store connection info, errors, etc.
-    is_active = Column(Boolean, default=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    session_id: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
+    device_id: Mapped[int] = mapped_column(Integer, ForeignKey("devices.id"), nullable=False)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    ended_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    duration_seconds: Mapped[Optional[float]] = mapped_column(Float)
+    total_bytes_received: Mapped[Optional[int]] = mapped_column(BigInteger, default=0)
+    avg_bitrate_kbps: Mapped[Optional[float]] = mapped_column(Float)
+    connection_quality: Mapped[Optional[str]] = mapped_column(String)  # excellent, good, fair, poor
+    disconnect_reason: Mapped[Optional[str]] = mapped_column(String)
+    meta: Mapped[Optional[dict]] = mapped_column("metadata", JSON)  # Store connection info, errors, etc.
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
     
     # Relationships
-    device = relationship("Device", back_populates="stream_sessions")
+    device: Mapped["Device"] = relationship(back_populates="stream_sessions", lazy="raise")
+    
+    __table_args__ = (
+        # Keyset pagination for a user's sessions, reached through their devices
+        Index("ix_stream_sessions_device_started", "device_id", started_at.desc(), id.desc()),
+        # Active-session lookups per device
+        Index("ix_stream_sessions_device_active", "device_id", "is_active"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
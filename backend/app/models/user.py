@@ -1,22 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from typing import TYPE_CHECKING, List, Optional
+from datetime import datetime
+from sqlalchemy import Integer, String, DateTime, Boolean
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.database import Base
 
+if TYPE_CHECKING:
+    from .alert import Alert
+    from .device import Device
+
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(Integer, primary_key=True, index=True)
-    email = Column(String, unique=True, index=True, nullable=False)
-    hashed_password = Column(String, nullable=False)
-    first_name = Column(String, nullable=False)
-    last_name = Column(String, nullable=False)
-    is_active = Column(Boolean, default=True)
-    is_verified = Column(Boolean, default=False)
-    firebase_uid = Column(String, unique=True, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    email: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
+    hashed_password: Mapped[str] = mapped_column(String, nullable=False)
+    first_name: Mapped[str] = mapped_column(String, nullable=False)
+    last_name: Mapped[str] = mapped_column(String, nullable=False)
+    is_active: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+    is_verified: Mapped[Optional[bool]] = mapped_column(Boolean, default=False)
+    firebase_uid: Mapped[Optional[str]] = mapped_column(String, unique=True, nullable=True)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
-    devices = relationship("Device", back_populates="owner")
-    alerts = relationship("Alert", back_populates="user")
+    devices: Mapped[List["Device"]] = relationship(back_populates="owner")
+    alerts: Mapped[List["Alert"]] = relationship(back_populates="user")
+    
+    __mapper_args__ = {"eager_defaults": True}
@@ -1,17 +1,59 @@
 import firebase_admin
 from firebase_admin import credentials, messaging
+import httpx
+import orjson
+import asyncio
 import logging
-from typing import Optional, Dict, Any, List
-import json
+from typing import Optional, Dict, Any, List, Set
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
 import os
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+FCM_BASE_URL = "https://fcm.googleapis.com"
+FCM_SEND_URL = FCM_BASE_URL + "/v1/projects/{project_id}/messages:send"
+NOTIFICATION_BATCH_WINDOW_SECONDS = 0.2
+# FCM advertises 100 concurrent HTTP/2 streams; more in-flight requests just queue behind them
+FCM_MAX_CONCURRENT_STREAMS = 100
+# Large fan-outs are sent a group at a time, bounding pending coroutines and responses
+FCM_SEND_GROUP_SIZE = 500
+# Refresh the OAuth2 token this long before Google expires it
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+# Floor between background refresh attempts, so a failing refresh doesn't spin
+TOKEN_RETRY_SECONDS = 30
+
+# Static per-channel Android blocks, shared by every message instead of rebuilt per send
+ANDROID_NOTIFICATION = {
+    "icon": "ic_notification",
+    "color": "#FF6B35",
+    "sound": "default"
+}
+ANDROID_CONFIGS = {
+    channel_id: {
+        "priority": "high",
+        "notification": {**ANDROID_NOTIFICATION, "channel_id": channel_id} if channel_id else ANDROID_NOTIFICATION
+    }
+    for channel_id in (None, "baby_monitor_alerts")
+}
+
 class FirebaseService:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.app = None
+        self.credential: Optional[credentials.Certificate] = None
+        self.client = client or httpx.AsyncClient(http2=True)
+        self.send_url: Optional[str] = None
+        self._access_token: Optional[str] = None
+        self._token_expiry: Optional[datetime] = None
+        self._token_lock = asyncio.Lock()
+        self._token_task: Optional[asyncio.Task] = None
+        self._send_slots = asyncio.Semaphore(FCM_MAX_CONCURRENT_STREAMS)
+        # Notifications queued per token during the batch window
+        self.pending_notifications: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._flush_tasks: Set[asyncio.Task] = set()
         self._initialize_firebase()
     
     def _initialize_firebase(self):
@@ -21,14 +63,120 @@ class FirebaseService:
                 logger.warning("Firebase credentials file not found")
                 return
             
-            cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
-            self.app = firebase_admin.initialize_app(cred)
+            self.credential = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
+            self.app = firebase_admin.initialize_app(self.credential)
+            self.send_url = FCM_SEND_URL.format(project_id=self.credential.project_id)
             logger.info("Firebase service initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize Firebase: {e}")
             self.app = None
     
+    async def warmup(self):
+        """Open the HTTP/2 connection and fetch the first token so the first alert doesn't pay for either"""
+        if not self.app:
+            return
+        
+        try:
+            await self.client.head(FCM_BASE_URL)
+            await self._auth_headers()
+            logger.info("Firebase HTTP/2 connection warmed up")
+        except Exception as e:
+            logger.warning(f"Firebase warmup failed: {e}")
+    
+    async def close(self):
+        """Close the shared HTTP/2 client"""
+        if self._token_task:
+            self._token_task.cancel()
+        await self.client.aclose()
+    
+    async def _auth_headers(self, force_refresh: bool = False) -> Dict[str, str]:
+        """Build FCM v1 request headers, reusing the OAuth2 bearer token until it nears expiry"""
+        async with self._token_lock:
+            if (
+                force_refresh
+                or self._access_token is None
+                or datetime.utcnow() >= self._token_expiry - TOKEN_REFRESH_MARGIN
+            ):
+                # get_access_token always refreshes, as a blocking HTTP call inside google-auth
+                token = await asyncio.to_thread(self.credential.get_access_token)
+                self._access_token = token.access_token
+                self._token_expiry = token.expiry or datetime.utcnow() + TOKEN_REFRESH_MARGIN
+                
+                # From the first token on, refreshes happen ahead of expiry in the background
+                if self._token_task is None:
+                    self._token_task = asyncio.create_task(self._token_refresh_loop())
+        
+        return {
+            "Authorization": f"Bearer {self._access_token}",
+            "Content-Type": "application/json"
+        }
+    
+    async def _token_refresh_loop(self):
+        """Refresh the OAuth2 token shortly before it expires so sends never wait on it"""
+        while True:
+            delay = (self._token_expiry - TOKEN_REFRESH_MARGIN - datetime.utcnow()).total_seconds()
+            await asyncio.sleep(max(delay, TOKEN_RETRY_SECONDS))
+            try:
+                await self._auth_headers(force_refresh=True)
+            except Exception as e:
+                logger.error(f"Failed to refresh FCM access token: {e}")
+    
+    async def _post(self, content: bytes, headers: Dict[str, str]) -> str:
+        """POST a serialized FCM v1 request and return its message name"""
+        async with self._send_slots:
+            response = await self.client.post(self.send_url, content=content, headers=headers)
+            
+            # A revoked or expired token gets one retry with a new one
+            if response.status_code == 401:
+                headers = await self._auth_headers(force_refresh=True)
+                response = await self.client.post(self.send_url, content=content, headers=headers)
+        
+        response.raise_for_status()
+        return orjson.loads(response.content)["name"]
+    
+    async def _send(self, message: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> str:
+        """POST a single FCM v1 message and return its message name"""
+        if headers is None:
+            headers = await self._auth_headers()
+        
+        return await self._post(orjson.dumps({"message": message}), headers)
+    
+    @staticmethod
+    def _token_bodies(shared: bytes, tokens: List[str]) -> List[bytes]:
+        """Splice each token into a copy of the serialized shared message fields"""
+        return [b'{"message":{"token":' + orjson.dumps(token) + b"," + shared + b"}" for token in tokens]
+    
+    @staticmethod
+    def _build_message(
+        title: str,
+        body: str,
+        data: Optional[Dict[str, str]] = None,
+        channel_id: Optional[str] = None,
+        badge: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Build the FCM v1 message body shared by token notifications"""
+        android = ANDROID_CONFIGS.get(channel_id)
+        if android is None:
+            android = {
+                "priority": "high",
+                "notification": {**ANDROID_NOTIFICATION, "channel_id": channel_id}
+            }
+        
+        aps = {
+            "alert": {"title": title, "body": body},
+            "sound": "default"
+        }
+        if badge is not None:
+            aps["badge"] = badge
+        
+        return {
+            "notification": {"title": title, "body": body},
+            "data": data or {},
+            "android": android,
+            "apns": {"payload": {"aps": aps}}
+        }
+    
     async def send_notification(
         self,
         token: str,
@@ -42,37 +190,10 @@ class FirebaseService:
             return False
         
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body
-                ),
-                data=data or {},
-                token=token,
-                android=messaging.AndroidConfig(
-                    priority='high',
-                    notification=messaging.AndroidNotification(
-                        icon='ic_notification',
-                        color='#FF6B35',
-                        sound='default',
-                        channel_id='baby_monitor_alerts'
-                    )
-                ),
-                apns=messaging.APNSConfig(
-                    payload=messaging.APNSPayload(
-                        aps=messaging.Aps(
-                            alert=messaging.ApsAlert(
-                                title=title,
-                                body=body
-                            ),
-                            sound='default',
-                            badge=1
-                        )
-                    )
-                )
-            )
-            
-            response = messaging.send(message)
+            message = self._build_message(title, body, data, channel_id="baby_monitor_alerts", badge=1)
+            message["token"] = token
+            
+            response = await self._send(message)
             logger.info(f"Notification sent successfully: {response}")
             return True
             
@@ -80,60 +201,81 @@ class FirebaseService:
             logger.error(f"Failed to send notification: {e}")
             return False
     
-    async def send_multicast_notification(
+    async def queue_notification(
         self,
-        tokens: List[str],
+        token: str,
         title: str,
         body: str,
         data: Optional[Dict[str, str]] = None
-    ) -> Dict[str, Any]:
-        """Send notification to multiple devices"""
+    ):
+        """Queue a push notification; bursts for the same token go out as one batch"""
+        message = self._build_message(title, body, data, channel_id="baby_monitor_alerts", badge=1)
+        message["token"] = token
+        
+        pending = self.pending_notifications[token]
+        pending.append(message)
+        
+        # The first message for a token opens its batch window
+        if len(pending) == 1:
+            task = asyncio.create_task(self._flush_notifications(token))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+    
+    async def _flush_notifications(self, token: str):
+        await asyncio.sleep(NOTIFICATION_BATCH_WINDOW_SECONDS)
+        messages = self.pending_notifications.pop(token, [])
+        if messages:
+            await self.send_each(messages)
+    
+    async def send_each(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Send distinct messages concurrently over the shared HTTP/2 connection"""
+        return await self._send_bodies([orjson.dumps({"message": message}) for message in messages])
+    
+    async def _send_bodies(self, bodies: List[bytes]) -> Dict[str, Any]:
+        """POST serialized requests concurrently over the shared HTTP/2 connection"""
         if not self.app:
             logger.error("Firebase not initialized")
-            return {"success_count": 0, "failure_count": len(tokens)}
+            return {"success_count": 0, "failure_count": len(bodies)}
         
         try:
-            message = messaging.MulticastMessage(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body
-                ),
-                data=data or {},
-                tokens=tokens,
-                android=messaging.AndroidConfig(
-                    priority='high',
-                    notification=messaging.AndroidNotification(
-                        icon='ic_notification',
-                        color='#FF6B35',
-                        sound='default'
-                    )
-                ),
-                apns=messaging.APNSConfig(
-                    payload=messaging.APNSPayload(
-                        aps=messaging.Aps(
-                            alert=messaging.ApsAlert(
-                                title=title,
-                                body=body
-                            ),
-                            sound='default'
-                        )
-                    )
-                )
-            )
-            
-            response = messaging.send_multicast(message)
-            
-            logger.info(f"Multicast notification sent - Success: {response.success_count}, Failure: {response.failure_count}")
+            headers = await self._auth_headers()
+            results = []
+            for start in range(0, len(bodies), FCM_SEND_GROUP_SIZE):
+                results.extend(await asyncio.gather(
+                    *(self._post(content, headers) for content in bodies[start:start + FCM_SEND_GROUP_SIZE]),
+                    return_exceptions=True
+                ))
+            
+            responses = [
+                {"success": False, "message_id": None} if isinstance(result, Exception)
+                else {"success": True, "message_id": result}
+                for result in results
+            ]
+            success_count = sum(1 for resp in responses if resp["success"])
+            failure_count = len(responses) - success_count
+            
+            logger.info(f"Notification batch sent - Success: {success_count}, Failure: {failure_count}")
             
             return {
-                "success_count": response.success_count,
-                "failure_count": response.failure_count,
-                "responses": [{"success": resp.success, "message_id": resp.message_id} for resp in response.responses]
+                "success_count": success_count,
+                "failure_count": failure_count,
+                "responses": responses
             }
             
         except Exception as e:
-            logger.error(f"Failed to send multicast notification: {e}")
-            return {"success_count": 0, "failure_count": len(tokens)}
+            logger.error(f"Failed to send notification batch: {e}")
+            return {"success_count": 0, "failure_count": len(bodies)}
+    
+    async def send_multicast_notification(
+        self,
+        tokens: List[str],
+        title: str,
+        body: str,
+        data: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Send notification to multiple devices"""
+        shared = encoded_shared_message(title, body, tuple(data.items()) if data else ())
+        return await self._send_bodies(self._token_bodies(shared, tokens))
     
     async def send_topic_notification(
         self,
@@ -147,16 +289,13 @@ class FirebaseService:
             return False
         
         try:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body
-                ),
-                data=data or {},
-                topic=topic
-            )
-            
-            response = messaging.send(message)
+            message = {
+                "notification": {"title": title, "body": body},
+                "data": data or {},
+                "topic": topic
+            }
+            
+            response = await self._send(message)
             logger.info(f"Topic notification sent to {topic}: {response}")
             return True
             
@@ -201,3 +340,8 @@ class FirebaseService:
         except Exception as e:
             logger.error(f"Failed to unsubscribe from topic: {e}")
             return {"success_count": 0, "failure_count": len(tokens)}
+
+@lru_cache(maxsize=256)
+def encoded_shared_message(title: str, body: str, data_items: tuple) -> bytes:
+    """Serialized multicast fields after the opening brace; repeated alert copy is encoded once"""
+    return orjson.dumps(FirebaseService._build_message(title, body, dict(data_items)))[1:]
@@ -1,38 +1,98 @@
-from kafka import KafkaProducer, KafkaConsumer
-from kafka.errors import KafkaError
-import json
+from aiokafka import AIOKafkaProducer, AIOKafkaConsumer, ConsumerRecord
+from aiokafka.errors import KafkaError
+import orjson
 import asyncio
 import logging
-from typing import Dict, Any, Optional
-from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+from collections import defaultdict
+from time import monotonic
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+BATCH_FLUSH_INTERVAL_SECONDS = 0.1
+BATCH_MAX_MESSAGES = 500
+
+# Failed batches are retried, but a topic never holds more than this many messages;
+# past it the oldest are dropped so a broker outage can't grow the buffer without bound
+BATCH_MAX_BUFFERED_MESSAGES = 10 * BATCH_MAX_MESSAGES
+
+# Stream chunk metadata is handed to the producer at most this often
+STREAM_FLUSH_INTERVAL_SECONDS = 0.02
+
+# Records handed to handlers per consumer fetch
+CONSUMER_MAX_RECORDS = 100
+
+# Pause after a failed fetch before polling the broker again
+CONSUMER_RETRY_BACKOFF_SECONDS = 1.0
+
+# Record header carrying the device id, so consumers can route without parsing the value
+DEVICE_ID_HEADER = "device_id"
+
+class LazyMessage:
+    """Kafka message value, parsed only when a field beyond device_id is read"""
+    __slots__ = ("raw", "_value", "_device_id")
+    
+    def __init__(self, raw: Optional[bytes], value: Optional[Dict[str, Any]] = None, device_id: Optional[str] = None):
+        self.raw = raw
+        self._value = value
+        self._device_id = device_id
+    
+    @property
+    def value(self) -> Dict[str, Any]:
+        if self._value is None:
+            self._value = orjson.loads(self.raw)
+        return self._value
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.value.get(key, default)
+    
+    @property
+    def device_id(self) -> Optional[str]:
+        """The record's device_id header when present, otherwise the parsed field"""
+        if self._device_id is not None:
+            return self._device_id
+        return self.value.get("device_id")
+
 class KafkaService:
     def __init__(self):
-        self.producer: Optional[KafkaProducer] = None
-        self.consumers: Dict[str, KafkaConsumer] = {}
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.producer: Optional[AIOKafkaProducer] = None
+        self.consumers: Dict[str, AIOKafkaConsumer] = {}
+        self.consumer_tasks: Dict[str, asyncio.Task] = {}
         self.running = False
+        # Buffers are only touched from the event loop, so no lock is needed
+        self.batch_buffers: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.flush_task: Optional[asyncio.Task] = None
+        # Keyed stream messages waiting for the stream flusher
+        self.stream_buffers: Dict[str, List[Tuple[str, Dict[str, Any]]]] = defaultdict(list)
+        self.stream_event = asyncio.Event()
+        self.stream_flush_task: Optional[asyncio.Task] = None
     
     async def start(self):
         """Initialize Kafka producer and consumers"""
         try:
             # Initialize producer
-            self.producer = KafkaProducer(
+            self.producer = AIOKafkaProducer(
                 bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS.split(','),
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
+                value_serializer=lambda v: orjson.dumps(v, option=orjson.OPT_SERIALIZE_NUMPY),
                 key_serializer=lambda k: k.encode('utf-8') if k else None,
+                # Throughput over per-message latency: sends within linger_ms share a request
+                max_batch_size=262144,
+                linger_ms=20,
+                compression_type='lz4',
+                acks=1,
                 retry_backoff_ms=500,
                 request_timeout_ms=30000
             )
+            await self.producer.start()
             
             # Initialize consumers for different topics
             await self._setup_consumers()
             
             self.running = True
+            self.flush_task = asyncio.create_task(self._flush_loop())
+            self.stream_flush_task = asyncio.create_task(self._stream_flush_loop())
             logger.info("Kafka service started successfully")
             
         except Exception as e:
@@ -43,13 +103,25 @@ class KafkaService:
         """Stop all Kafka connections"""
         self.running = False
         
+        if self.flush_task:
+            self.flush_task.cancel()
+        
+        if self.stream_flush_task:
+            self.stream_flush_task.cancel()
+        
         if self.producer:
-            self.producer.close()
+            await self._flush_stream_buffers()
+            await self._flush_batches()
+            await self.producer.stop()
+        
+        # Consumer loops go first so none is mid-fetch when its consumer stops
+        for task in self.consumer_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.consumer_tasks.values(), return_exceptions=True)
         
         for consumer in self.consumers.values():
-            consumer.close()
+            await consumer.stop()
         
-        self.executor.shutdown(wait=True)
         logger.info("Kafka service stopped")
     
     async def _setup_consumers(self):
@@ -61,30 +133,124 @@ class KafkaService:
         ]
         
         for topic in topics:
-            consumer = KafkaConsumer(
+            # Values stay raw bytes; consume_messages wraps them in LazyMessage
+            consumer = AIOKafkaConsumer(
                 topic,
                 bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS.split(','),
-                value_deserializer=lambda m: json.loads(m.decode('utf-8')),
                 auto_offset_reset='latest',
                 group_id=f'baby-monitor-{topic}-group'
             )
+            await consumer.start()
             self.consumers[topic] = consumer
     
-    async def send_message(self, topic: str, message: Dict[str, Any], key: Optional[str] = None):
+    async def send_message(
+        self,
+        topic: str,
+        message: Dict[str, Any],
+        key: Optional[str] = None,
+        headers: Optional[List[Tuple[str, bytes]]] = None
+    ):
         """Send message to Kafka topic"""
         if not self.producer:
             logger.error("Kafka producer not initialized")
             return False
         
         try:
-            future = self.producer.send(topic, value=message, key=key)
-            # Don't wait for result in async context - fire and forget
+            # Only waits for buffer space; delivery is fire and forget
+            await self.producer.send(topic, value=message, key=key, headers=headers)
             return True
             
         except KafkaError as e:
             logger.error(f"Failed to send message to {topic}: {e}")
             return False
     
+    async def send_batch(self, topic: str, messages: List[Tuple[Optional[str], Dict[str, Any]]]) -> bool:
+        """Send keyed messages to a topic, then wait for all of them with a single flush"""
+        if not self.producer:
+            logger.error("Kafka producer not initialized")
+            return False
+        
+        try:
+            futures = [await self.producer.send(topic, value=value, key=key) for key, value in messages]
+            
+            # One flush pushes everything queued, then every delivery is collected
+            await self.producer.flush()
+            results = await asyncio.gather(*futures, return_exceptions=True)
+            
+            failed = sum(1 for result in results if isinstance(result, Exception))
+            if failed:
+                logger.error(f"Failed to send {failed} of {len(messages)} messages to {topic}")
+            return failed == 0
+            
+        except KafkaError as e:
+            logger.error(f"Failed to send batch to {topic}: {e}")
+            return False
+    
+    async def buffer_message(self, topic: str, message: Dict[str, Any]):
+        """Queue a message to be produced as part of the next batch for topic"""
+        buffer = self.batch_buffers[topic]
+        buffer.append(message)
+        
+        if len(buffer) >= BATCH_MAX_MESSAGES:
+            await self._flush_topic(topic)
+    
+    async def _flush_loop(self):
+        """Periodically produce buffered messages as one batch per topic"""
+        while self.running:
+            await asyncio.sleep(BATCH_FLUSH_INTERVAL_SECONDS)
+            await self._flush_batches()
+    
+    async def _flush_batches(self):
+        for topic in list(self.batch_buffers):
+            await self._flush_topic(topic)
+    
+    async def _flush_topic(self, topic: str):
+        pending = self.batch_buffers.pop(topic, None)
+        if not pending or not self.producer:
+            return
+        
+        # Retried batches can push a topic past one envelope; send it in envelope-sized slices
+        for start in range(0, len(pending), BATCH_MAX_MESSAGES):
+            await self._send_envelope(topic, pending[start:start + BATCH_MAX_MESSAGES])
+    
+    async def _send_envelope(self, topic: str, batch: List[Dict[str, Any]]):
+        try:
+            future = await self.producer.send(topic, value={"batch": batch})
+            future.add_done_callback(lambda f: self._on_batch_sent(topic, batch, f))
+        except KafkaError as e:
+            self._on_batch_error(topic, batch, e)
+    
+    def _on_batch_sent(self, topic: str, batch: List[Dict[str, Any]], future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            self._on_batch_error(topic, batch, future.exception())
+    
+    def _on_batch_error(self, topic: str, batch: List[Dict[str, Any]], error: Exception):
+        """Put a failed batch back in front of the buffer so it is retried on the next flush"""
+        logger.error(f"Failed to send batch of {len(batch)} messages to {topic}: {error}")
+        buffer = self.batch_buffers[topic]
+        buffer[:0] = batch
+        
+        overflow = len(buffer) - BATCH_MAX_BUFFERED_MESSAGES
+        if overflow > 0:
+            del buffer[:overflow]
+            logger.error(f"Dropped {overflow} oldest buffered messages for {topic} after repeated send failures")
+    
+    async def _stream_flush_loop(self):
+        """Hand queued stream messages to the producer once per flush interval"""
+        while self.running:
+            await self.stream_event.wait()
+            # Let a burst of chunks accumulate before waking the producer
+            await asyncio.sleep(STREAM_FLUSH_INTERVAL_SECONDS)
+            await self._flush_stream_buffers()
+    
+    async def _flush_stream_buffers(self):
+        buffers, self.stream_buffers = self.stream_buffers, defaultdict(list)
+        self.stream_event.clear()
+        
+        for topic, messages in buffers.items():
+            for key, message in messages:
+                await self.send_message(topic, message, key=key, headers=[(DEVICE_ID_HEADER, key.encode())])
+    
     async def send_stream_data(self, device_id: str, data: bytes):
         """Send streaming data to appropriate topic based on content type"""
         # Simple heuristic to determine content type
@@ -100,33 +266,75 @@ class KafkaService:
             "device_id": device_id,
             "content_type": content_type,
             "data_size": len(data),
-            "timestamp": asyncio.get_event_loop().time()
+            "timestamp": monotonic()
         }
         
-        await self.send_message(topic, message, key=device_id)
+        # Coalesced by the stream flusher; keys keep each device on one partition
+        self.stream_buffers[topic].append((device_id, message))
+        self.stream_event.set()
     
     async def send_alert(self, alert_data: Dict[str, Any]):
         """Send alert to alerts topic"""
         await self.send_message(settings.KAFKA_ALERTS_TOPIC, alert_data)
     
-    def get_consumer(self, topic: str) -> Optional[KafkaConsumer]:
+    def get_consumer(self, topic: str) -> Optional[AIOKafkaConsumer]:
         """Get consumer for specific topic"""
         return self.consumers.get(topic)
     
-    async def consume_messages(self, topic: str, handler_func):
-        """Consume messages from topic with handler function"""
+    @staticmethod
+    def _lazy_messages(record: ConsumerRecord) -> List[LazyMessage]:
+        # buffer_message envelopes have to be parsed to fan out; single messages wait
+        raw = record.value
+        if raw is None:
+            raise ValueError("record has no value")
+        if raw.startswith(b'{"batch":'):
+            return [LazyMessage(None, value) for value in orjson.loads(raw)["batch"]]
+        
+        device_id = next((value.decode() for name, value in record.headers or () if name == DEVICE_ID_HEADER), None)
+        return [LazyMessage(raw, device_id=device_id)]
+    
+    async def consume_messages(self, topic: str, handler_func) -> Optional[asyncio.Task]:
+        """Start consuming a topic with handler function; returns the consumer task"""
         consumer = self.get_consumer(topic)
         if not consumer:
             logger.error(f"No consumer found for topic: {topic}")
-            return
+            return None
+        
+        if topic in self.consumer_tasks:
+            logger.warning(f"Topic {topic} is already being consumed")
+            return self.consumer_tasks[topic]
         
-        def _consume():
+        task = asyncio.create_task(self._consume_loop(topic, consumer, handler_func))
+        self.consumer_tasks[topic] = task
+        return task
+    
+    async def _consume_loop(self, topic: str, consumer: AIOKafkaConsumer, handler_func):
+        """One task per topic, running until the service stops"""
+        while self.running:
             try:
-                for message in consumer:
-                    if not self.running:
-                        break
-                    asyncio.create_task(handler_func(message.value))
+                # Records from one fetch are handled concurrently (so audio can batch);
+                # the next fetch waits for them, which gives the consumer backpressure
+                fetched = await consumer.getmany(timeout_ms=1000, max_records=CONSUMER_MAX_RECORDS)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
+                # A failed fetch must not end the topic's consumer; retry after a pause
                 logger.error(f"Error consuming from {topic}: {e}")
-        
-        await asyncio.get_event_loop().run_in_executor(self.executor, _consume)
+                await asyncio.sleep(CONSUMER_RETRY_BACKOFF_SECONDS)
+                continue
+            
+            # Batched messages fan out to one handler call per entry; offsets are already
+            # committed, so a bad record is skipped rather than dropping the whole fetch
+            values = []
+            for messages in fetched.values():
+                for message in messages:
+                    try:
+                        values.extend(self._lazy_messages(message))
+                    except Exception as e:
+                        logger.error(f"Skipping record from {topic} at offset {message.offset}: {e}")
+            
+            if values:
+                results = await asyncio.gather(*(handler_func(value) for value in values), return_exceptions=True)
+                for result in results:
+                    if isinstance(result, BaseException):
+                        logger.error(f"Handler failed for message from {topic}: {result!r}")
@@ -1,16 +1,70 @@
 import aioredis
-import json
+import orjson
 import logging
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, List, Tuple
 from datetime import timedelta
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Live session state expires once a session has gone this long without a chunk
+SESSION_STATE_TTL_SECONDS = 86400
+
+# Only count bytes for sessions that still have live state; a bare HINCRBY
+# would resurrect the hash after end_stream_session deleted it. Each chunk
+# pushes the expiry out, so long sessions keep their counter
+ADD_SESSION_BYTES_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    local total = redis.call('HINCRBY', KEYS[1], 'bytes', ARGV[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return total
+end
+return nil
+"""
+
+# Fixed-window counter: the first hit in a window starts its expiry, in one round-trip
+RATE_LIMIT_SCRIPT = """
+local current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return current
+"""
+
+def encode_value(value: Any) -> bytes:
+    """Single codec for cached values: bytes pass through, everything else is JSON via orjson,
+    so get() returns strings, numbers, dicts and lists as they were set"""
+    if isinstance(value, (bytes, bytearray)):
+        return value
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def decode_value(value: Optional[str]) -> Optional[Any]:
+    """Inverse of encode_value; values that aren't JSON come back as stored"""
+    if value is None:
+        return None
+    try:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return value
+
+# Key templates, one place per key shape
+DEVICE_STATUS_KEY = "device:status:{}".format
+DEVICE_OWNER_KEY = "device:owner:{}".format
+ML_RESULT_KEY = "ml:result:{}:{}".format
+CRY_RESULT_KEY = "cry:{}".format
+SESSION_FILES_KEY = "s3list:{}:{}".format
+SESSION_OWNER_KEY = "session:owner:{}".format
+SESSION_STATE_KEY = "session:state:{}".format
+ALERT_STATS_VERSION_KEY = "alerts:stats:version:{}".format
+ALERT_STATS_KEY = "alerts:stats:{}:{}:{}".format
+RATE_LIMIT_KEY = "rate_limit:{}".format
+
 class RedisService:
     def __init__(self):
         self.redis: Optional[aioredis.Redis] = None
+        self._add_session_bytes = None
+        self._rate_limit = None
     
     async def connect(self):
         """Connect to Redis"""
@@ -26,6 +80,8 @@ class RedisService:
             
             # Test connection
             await self.redis.ping()
+            self._add_session_bytes = self.redis.register_script(ADD_SESSION_BYTES_SCRIPT)
+            self._rate_limit = self.redis.register_script(RATE_LIMIT_SCRIPT)
             logger.info("Redis service connected successfully")
             
         except Exception as e:
@@ -45,16 +101,30 @@ class RedisService:
             return False
         
         try:
-            if isinstance(value, (dict, list)):
-                value = json.dumps(value)
-            
-            await self.redis.set(key, value, ex=expire)
+            await self.redis.set(key, encode_value(value), ex=expire)
             return True
             
         except Exception as e:
             logger.error(f"Failed to set key {key}: {e}")
             return False
     
+    async def mset(self, items: List[Tuple[str, Any, Optional[int]]]) -> bool:
+        """Set several (key, value, expire) entries in one pipelined round-trip"""
+        if not self.redis:
+            logger.error("Redis not connected")
+            return False
+        
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value, expire in items:
+                    pipe.set(key, encode_value(value), ex=expire)
+                await pipe.execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Failed to set {len(items)} keys: {e}")
+            return False
+    
     async def get(self, key: str) -> Optional[Any]:
         """Get value by key"""
         if not self.redis:
@@ -62,32 +132,50 @@ class RedisService:
             return None
         
         try:
-            value = await self.redis.get(key)
-            if value is None:
-                return None
-            
-            # Try to parse as JSON
-            try:
-                return json.loads(value)
-            except json.JSONDecodeError:
-                return value
-                
+            return decode_value(await self.redis.get(key))
         except Exception as e:
             logger.error(f"Failed to get key {key}: {e}")
             return None
     
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several keys in one round-trip; missing keys come back as None"""
+        if not self.redis:
+            logger.error("Redis not connected")
+            return [None] * len(keys)
+        
+        if not keys:
+            return []
+        
+        try:
+            return [decode_value(value) for value in await self.redis.mget(keys)]
+        except Exception as e:
+            logger.error(f"Failed to get {len(keys)} keys: {e}")
+            return [None] * len(keys)
+    
     async def delete(self, key: str) -> bool:
         """Delete key"""
         if not self.redis:
             return False
         
         try:
-            result = await self.redis.delete(key)
+            # UNLINK frees the value in a background thread instead of blocking the server
+            result = await self.redis.unlink(key)
             return result > 0
         except Exception as e:
             logger.error(f"Failed to delete key {key}: {e}")
             return False
     
+    async def bulk_delete(self, keys: List[str]) -> int:
+        """Delete several keys in one UNLINK; returns how many existed"""
+        if not self.redis or not keys:
+            return 0
+        
+        try:
+            return await self.redis.unlink(*keys)
+        except Exception as e:
+            logger.error(f"Failed to delete {len(keys)} keys: {e}")
+            return 0
+    
     async def exists(self, key: str) -> bool:
         """Check if key exists"""
         if not self.redis:
@@ -110,35 +198,190 @@ class RedisService:
             logger.error(f"Failed to increment key {key}: {e}")
             return None
     
+    async def publish(self, channel: str, message: str) -> int:
+        """Publish message to channel; returns the number of subscribers that received it"""
+        if not self.redis:
+            return 0
+        
+        try:
+            return await self.redis.publish(channel, message)
+        except Exception as e:
+            logger.error(f"Failed to publish to {channel}: {e}")
+            return 0
+    
     async def set_device_status(self, device_id: str, status: Dict[str, Any], expire: int = 300):
         """Set device status with 5-minute expiration"""
-        key = f"device:status:{device_id}"
+        key = DEVICE_STATUS_KEY(device_id)
         await self.set(key, status, expire)
     
+    async def mset_device_status(self, statuses: Dict[str, Dict[str, Any]], expire: int = 300) -> bool:
+        """Set several device statuses in one pipelined round-trip"""
+        return await self.mset([
+            (DEVICE_STATUS_KEY(device_id), status, expire)
+            for device_id, status in statuses.items()
+        ])
+    
     async def get_device_status(self, device_id: str) -> Optional[Dict[str, Any]]:
         """Get device status"""
-        key = f"device:status:{device_id}"
+        key = DEVICE_STATUS_KEY(device_id)
         return await self.get(key)
     
+    async def mget_device_status(self, device_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Get several device statuses in one round-trip"""
+        values = await self.mget([DEVICE_STATUS_KEY(device_id) for device_id in device_ids])
+        return dict(zip(device_ids, values))
+    
     async def cache_ml_result(self, session_id: str, model_type: str, result: Dict[str, Any], expire: int = 3600):
         """Cache ML inference result for 1 hour"""
-        key = f"ml:result:{session_id}:{model_type}"
+        key = ML_RESULT_KEY(session_id, model_type)
         await self.set(key, result, expire)
     
     async def get_cached_ml_result(self, session_id: str, model_type: str) -> Optional[Dict[str, Any]]:
         """Get cached ML result"""
-        key = f"ml:result:{session_id}:{model_type}"
+        key = ML_RESULT_KEY(session_id, model_type)
+        return await self.get(key)
+    
+    async def mget_cached_ml_result(self, entries: List[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """Get cached ML results for several (session_id, model_type) pairs in one round-trip"""
+        return await self.mget([ML_RESULT_KEY(session_id, model_type) for session_id, model_type in entries])
+    
+    async def cache_cry_result(self, content_hash: str, result: Dict[str, Any], expire: int = 60):
+        """Cache a cry detection result by audio content hash for 1 minute"""
+        key = CRY_RESULT_KEY(content_hash)
+        await self.set(key, result, expire)
+    
+    async def cache_audio_results(self, session_id: str, content_hash: str, result: Dict[str, Any]):
+        """Cache a fresh cry detection for the session and by content hash in one round-trip"""
+        await self.mset([
+            (ML_RESULT_KEY(session_id, "audio"), result, 3600),
+            (CRY_RESULT_KEY(content_hash), result, 60)
+        ])
+    
+    async def get_cached_cry_result(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Get cached cry detection result for identical audio"""
+        key = CRY_RESULT_KEY(content_hash)
+        return await self.get(key)
+    
+    async def cache_session_files(self, device_id: str, session_id: str, files: Dict[str, list], expire: int = 60):
+        """Cache a session's S3 file listing for 1 minute"""
+        key = SESSION_FILES_KEY(device_id, session_id)
+        await self.set(key, files, expire)
+    
+    async def get_cached_session_files(self, device_id: str, session_id: str) -> Optional[Dict[str, list]]:
+        """Get cached S3 file listing for a session"""
+        key = SESSION_FILES_KEY(device_id, session_id)
+        return await self.get(key)
+    
+    async def invalidate_session_files(self, device_id: str, session_id: str):
+        """Drop a session's cached S3 file listing after it gains a file"""
+        await self.delete(SESSION_FILES_KEY(device_id, session_id))
+    
+    async def cache_device_owner(self, device_id: str, device_pk: int, user_id: int, expire: int = 300):
+        """Cache a device's internal id and owner for 5 minutes"""
+        key = DEVICE_OWNER_KEY(device_id)
+        await self.set(key, {"id": device_pk, "user_id": user_id}, expire)
+    
+    async def get_cached_device_owner(self, device_id: str) -> Optional[Dict[str, Any]]:
+        """Get cached device id and owner"""
+        key = DEVICE_OWNER_KEY(device_id)
+        return await self.get(key)
+    
+    async def cache_stream_session_owner(self, session_id: str, device_id: str, user_id: int, expire: int = 3600):
+        """Cache which device and user a stream session belongs to for 1 hour"""
+        key = SESSION_OWNER_KEY(session_id)
+        await self.set(key, {"device_id": device_id, "user_id": user_id}, expire)
+    
+    async def get_cached_stream_session_owner(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get cached stream session device and owner"""
+        key = SESSION_OWNER_KEY(session_id)
+        return await self.get(key)
+    
+    async def start_stream_session_state(self, session_id: str, device_id: str, user_id: int, expire: int = SESSION_STATE_TTL_SECONDS):
+        """Track a live stream session's owner and byte counter in a hash until it goes idle"""
+        if not self.redis:
+            return False
+        
+        key = SESSION_STATE_KEY(session_id)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.hset(key, mapping={"active": 1, "bytes": 0, "device_id": device_id, "user_id": user_id})
+            pipe.expire(key, expire)
+            await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to start session state {session_id}: {e}")
+            return False
+    
+    async def get_stream_session_state(self, session_id: str) -> Optional[Dict[str, str]]:
+        """Get live stream session state, or None if the session isn't tracked"""
+        if not self.redis:
+            return None
+        
+        try:
+            return await self.redis.hgetall(SESSION_STATE_KEY(session_id)) or None
+        except Exception as e:
+            logger.error(f"Failed to get session state {session_id}: {e}")
+            return None
+    
+    async def add_stream_session_bytes(self, session_id: str, num_bytes: int) -> Optional[int]:
+        """Add to a live session's byte counter; returns None if the session isn't tracked"""
+        if not self.redis:
+            return None
+        
+        try:
+            return await self._add_session_bytes(
+                keys=[SESSION_STATE_KEY(session_id)],
+                args=[num_bytes, SESSION_STATE_TTL_SECONDS]
+            )
+        except Exception as e:
+            logger.error(f"Failed to add bytes to session {session_id}: {e}")
+            return None
+    
+    async def get_stream_session_bytes(self, session_id: str) -> int:
+        """Read a live session's byte counter"""
+        if not self.redis:
+            return 0
+        
+        try:
+            return int(await self.redis.hget(SESSION_STATE_KEY(session_id), "bytes") or 0)
+        except Exception as e:
+            logger.error(f"Failed to get bytes for session {session_id}: {e}")
+            return 0
+    
+    async def end_stream_session_state(self, session_id: str):
+        """Drop a session's live state and cached owner once its counter has been persisted"""
+        if not self.redis:
+            return
+        
+        try:
+            await self.redis.unlink(SESSION_STATE_KEY(session_id), SESSION_OWNER_KEY(session_id))
+        except Exception as e:
+            logger.error(f"Failed to end session state {session_id}: {e}")
+    
+    async def get_alert_stats_version(self, user_id: int) -> int:
+        """Get the user's alert stats version, bumped whenever their alerts change"""
+        return await self.get(ALERT_STATS_VERSION_KEY(user_id)) or 0
+    
+    async def invalidate_alert_stats(self, user_id: int):
+        """Invalidate every cached stats window for a user without a key scan"""
+        await self.increment(ALERT_STATS_VERSION_KEY(user_id))
+    
+    async def cache_alert_stats(self, user_id: int, days: int, version: int, stats: Dict[str, Any], expire: int = 30):
+        """Cache alert stats for 30 seconds"""
+        key = ALERT_STATS_KEY(user_id, version, days)
+        await self.set(key, stats, expire)
+    
+    async def get_cached_alert_stats(self, user_id: int, days: int, version: int) -> Optional[Dict[str, Any]]:
+        """Get cached alert stats"""
+        key = ALERT_STATS_KEY(user_id, version, days)
         return await self.get(key)
     
     async def rate_limit_check(self, identifier: str, limit: int, window: int) -> bool:
         """Check rate limit - returns True if under limit"""
-        key = f"rate_limit:{identifier}"
+        key = RATE_LIMIT_KEY(identifier)
         
         try:
-            current = await self.increment(key)
-            if current == 1:
-                await self.redis.expire(key, window)
-            
+            current = await self._rate_limit(keys=[key], args=[window])
             return current <= limit
             
         except Exception as e:
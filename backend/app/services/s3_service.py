@@ -1,18 +1,64 @@
 import boto3
-from botocore.exceptions import ClientError, NoCredentialsError
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+import asyncio
 import logging
-from typing import Optional, Dict, Any
-import uuid
-from datetime import datetime
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
+from functools import lru_cache
+import secrets
+import time
 import io
 
 from app.core.config import settings
+from app.services.redis_service import RedisService
 
 logger = logging.getLogger(__name__)
 
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Bodies at or above one part size are uploaded as parallel multipart parts
+UPLOAD_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_MIN_PART_SIZE,
+    multipart_chunksize=MULTIPART_MIN_PART_SIZE,
+    max_concurrency=8
+)
+
+# Bursts share one transfer manager, so parts from every object feed the same thread pool
+BURST_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_MIN_PART_SIZE,
+    multipart_chunksize=MULTIPART_MIN_PART_SIZE,
+    max_concurrency=16,
+    max_io_queue=1000,
+    use_threads=True
+)
+
+# One long-lived client serves every upload; the pool must cover concurrent
+# chunk uploads plus their multipart parts, or calls queue for a connection
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    s3={'addressing_style': 'virtual'}
+)
+
+CHUNK_FORMATS = {
+    "audio": ("wav", "audio/wav"),
+    "video": ("mp4", "video/mp4")
+}
+
+@lru_cache(maxsize=1024)
+def session_prefix(media_type: str, device_id: str, session_id: str) -> str:
+    """Key prefix for one session's chunks of a media type"""
+    return f"{media_type}/{device_id}/{session_id}/"
+
 class S3Service:
-    def __init__(self):
+    def __init__(self, redis_service: Optional[RedisService] = None):
         self.s3_client = None
+        self.redis_service = redis_service
+        self._timestamp_cache = (0, "")
         self._initialize_client()
     
     def _initialize_client(self):
@@ -22,7 +68,8 @@ class S3Service:
                 's3',
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_REGION
+                region_name=settings.AWS_REGION,
+                config=S3_CLIENT_CONFIG
             )
             logger.info("S3 client initialized successfully")
             
@@ -33,35 +80,38 @@ class S3Service:
             logger.error(f"Failed to initialize S3 client: {e}")
             self.s3_client = None
     
+    def _key_timestamp(self) -> str:
+        """UTC timestamp for object keys, formatted once per second"""
+        second = int(time.time())
+        if second != self._timestamp_cache[0]:
+            self._timestamp_cache = (second, time.strftime("%Y%m%d_%H%M%S", time.gmtime(second)))
+        return self._timestamp_cache[1]
+    
     async def upload_audio_chunk(self, device_id: str, session_id: str, audio_data: bytes) -> Optional[str]:
         """Upload audio chunk to S3"""
         if not self.s3_client:
             logger.error("S3 client not initialized")
             return None
         
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        chunk_id = str(uuid.uuid4())[:8]
-        key = f"audio/{device_id}/{session_id}/{timestamp}_{chunk_id}.wav"
+        timestamp = self._key_timestamp()
+        chunk_id = secrets.token_hex(4)
+        key = f"{session_prefix('audio', device_id, session_id)}{timestamp}_{chunk_id}.wav"
         
         try:
-            self.s3_client.put_object(
-                Bucket=settings.S3_BUCKET_NAME,
-                Key=key,
-                Body=audio_data,
-                ContentType='audio/wav',
-                Metadata={
-                    'device_id': device_id,
-                    'session_id': session_id,
-                    'timestamp': timestamp,
-                    'chunk_id': chunk_id
-                }
-            )
+            await self._put_object(key, audio_data, 'audio/wav', {
+                'device_id': device_id,
+                'session_id': session_id,
+                'timestamp': timestamp,
+                'chunk_id': chunk_id
+            })
+            
+            await self._invalidate_session_files(device_id, session_id)
             
             url = f"s3://{settings.S3_BUCKET_NAME}/{key}"
             logger.info(f"Audio chunk uploaded: {url}")
             return url
             
-        except ClientError as e:
+        except (ClientError, S3UploadFailedError) as e:
             logger.error(f"Failed to upload audio chunk: {e}")
             return None
     
@@ -71,57 +121,214 @@ class S3Service:
             logger.error("S3 client not initialized")
             return None
         
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        chunk_id = str(uuid.uuid4())[:8]
-        key = f"video/{device_id}/{session_id}/{timestamp}_{chunk_id}.mp4"
+        timestamp = self._key_timestamp()
+        chunk_id = secrets.token_hex(4)
+        key = f"{session_prefix('video', device_id, session_id)}{timestamp}_{chunk_id}.mp4"
         
         try:
-            self.s3_client.put_object(
-                Bucket=settings.S3_BUCKET_NAME,
-                Key=key,
-                Body=video_data,
-                ContentType='video/mp4',
-                Metadata={
-                    'device_id': device_id,
-                    'session_id': session_id,
-                    'timestamp': timestamp,
-                    'chunk_id': chunk_id
-                }
-            )
+            await self._put_object(key, video_data, 'video/mp4', {
+                'device_id': device_id,
+                'session_id': session_id,
+                'timestamp': timestamp,
+                'chunk_id': chunk_id
+            })
+            
+            await self._invalidate_session_files(device_id, session_id)
             
             url = f"s3://{settings.S3_BUCKET_NAME}/{key}"
             logger.info(f"Video chunk uploaded: {url}")
             return url
             
-        except ClientError as e:
+        except (ClientError, S3UploadFailedError) as e:
             logger.error(f"Failed to upload video chunk: {e}")
             return None
     
+    async def _put_object(self, key: str, data: bytes, content_type: str, metadata: Dict[str, str]):
+        """Upload bytes off the event loop, splitting large bodies into concurrent parts"""
+        if len(data) < MULTIPART_MIN_PART_SIZE:
+            await asyncio.to_thread(
+                self.s3_client.put_object,
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=key,
+                Body=data,
+                ContentType=content_type,
+                Metadata=metadata
+            )
+        else:
+            # BytesIO over a bytes object shares its buffer until written to, so this doesn't copy
+            await asyncio.to_thread(
+                self.s3_client.upload_fileobj,
+                io.BytesIO(data),
+                settings.S3_BUCKET_NAME,
+                key,
+                ExtraArgs={'ContentType': content_type, 'Metadata': metadata},
+                Config=UPLOAD_TRANSFER_CONFIG
+            )
+    
+    async def upload_many(self, items: List[Tuple[str, bytes, str]]) -> List[Optional[str]]:
+        """Upload a burst of (key, data, content_type) objects together; returns each S3 URL, or None if it failed"""
+        if not self.s3_client:
+            logger.error("S3 client not initialized")
+            return [None] * len(items)
+        
+        return await asyncio.to_thread(self._upload_many, items)
+    
+    def _upload_many(self, items: List[Tuple[str, bytes, str]]) -> List[Optional[str]]:
+        # Submit every upload first, then collect the results
+        with create_transfer_manager(self.s3_client, BURST_TRANSFER_CONFIG) as manager:
+            futures = [
+                manager.upload(io.BytesIO(data), settings.S3_BUCKET_NAME, key, extra_args={'ContentType': content_type})
+                for key, data, content_type in items
+            ]
+            
+            urls = []
+            for (key, _, _), future in zip(items, futures):
+                try:
+                    future.result()
+                    urls.append(f"s3://{settings.S3_BUCKET_NAME}/{key}")
+                except Exception as e:
+                    # Any transfer error (ClientError, BotoCoreError, S3UploadFailedError)
+                    # fails only its own item
+                    logger.error(f"Failed to upload {key}: {e}")
+                    urls.append(None)
+        
+        logger.info(f"Uploaded {sum(1 for url in urls if url)} of {len(items)} objects")
+        return urls
+    
+    async def upload_chunk_stream(
+        self,
+        device_id: str,
+        session_id: str,
+        chunk_type: str,
+        blocks: AsyncIterator[bytes]
+    ) -> Tuple[Optional[str], int]:
+        """Stream a chunk to S3 block by block; returns the S3 URL and bytes read"""
+        extension, content_type = CHUNK_FORMATS.get(chunk_type, CHUNK_FORMATS["video"])
+        timestamp = self._key_timestamp()
+        chunk_id = secrets.token_hex(4)
+        key = f"{session_prefix(chunk_type, device_id, session_id)}{timestamp}_{chunk_id}.{extension}"
+        metadata = {
+            'device_id': device_id,
+            'session_id': session_id,
+            'timestamp': timestamp,
+            'chunk_id': chunk_id
+        }
+        
+        total_bytes = 0
+        if not self.s3_client:
+            logger.error("S3 client not initialized")
+            async for block in blocks:
+                total_bytes += len(block)
+            return None, total_bytes
+        
+        upload_id = None
+        parts = []
+        # Blocks are held as received and joined once per part, rather than appended
+        # into a bytearray and then copied out again
+        part: List[bytes] = []
+        part_size = 0
+        
+        try:
+            async for block in blocks:
+                total_bytes += len(block)
+                part.append(block)
+                part_size += len(block)
+                
+                if part_size >= MULTIPART_MIN_PART_SIZE:
+                    if upload_id is None:
+                        response = await asyncio.to_thread(
+                            self.s3_client.create_multipart_upload,
+                            Bucket=settings.S3_BUCKET_NAME,
+                            Key=key,
+                            ContentType=content_type,
+                            Metadata=metadata
+                        )
+                        upload_id = response['UploadId']
+                    
+                    parts.append(await self._upload_part(key, upload_id, len(parts) + 1, b"".join(part)))
+                    part.clear()
+                    part_size = 0
+            
+            if upload_id is None:
+                # Small chunk: a single PUT is cheaper than a multipart round trip
+                await asyncio.to_thread(
+                    self.s3_client.put_object,
+                    Bucket=settings.S3_BUCKET_NAME,
+                    Key=key,
+                    Body=b"".join(part),
+                    ContentType=content_type,
+                    Metadata=metadata
+                )
+            else:
+                if part:
+                    parts.append(await self._upload_part(key, upload_id, len(parts) + 1, b"".join(part)))
+                
+                await asyncio.to_thread(
+                    self.s3_client.complete_multipart_upload,
+                    Bucket=settings.S3_BUCKET_NAME,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={'Parts': parts}
+                )
+            
+            await self._invalidate_session_files(device_id, session_id)
+            
+            url = f"s3://{settings.S3_BUCKET_NAME}/{key}"
+            logger.info(f"{chunk_type.title()} chunk streamed: {url}")
+            return url, total_bytes
+            
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Failed to stream {chunk_type} chunk: {e}")
+            if upload_id is not None:
+                await self._abort_multipart_upload(key, upload_id)
+            return None, total_bytes
+        except BaseException:
+            # Client disconnects and cancellation must not leave billed parts behind
+            if upload_id is not None:
+                await self._abort_multipart_upload(key, upload_id)
+            raise
+    
+    async def _abort_multipart_upload(self, key: str, upload_id: str):
+        try:
+            await asyncio.to_thread(
+                self.s3_client.abort_multipart_upload,
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=key,
+                UploadId=upload_id
+            )
+        except (ClientError, BotoCoreError) as e:
+            logger.error(f"Failed to abort multipart upload {upload_id} for {key}: {e}")
+    
+    async def _upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> Dict[str, Any]:
+        response = await asyncio.to_thread(
+            self.s3_client.upload_part,
+            Bucket=settings.S3_BUCKET_NAME,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+    
     async def upload_alert_media(self, alert_id: int, media_type: str, data: bytes) -> Optional[str]:
         """Upload alert-related media (audio/video snippets)"""
         if not self.s3_client:
             return None
         
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        timestamp = self._key_timestamp()
         extension = "wav" if media_type == "audio" else "mp4"
         key = f"alerts/{alert_id}/{timestamp}.{extension}"
         
         try:
-            self.s3_client.put_object(
-                Bucket=settings.S3_BUCKET_NAME,
-                Key=key,
-                Body=data,
-                ContentType=f'{media_type}/{"wav" if media_type == "audio" else "mp4"}',
-                Metadata={
-                    'alert_id': str(alert_id),
-                    'media_type': media_type,
-                    'timestamp': timestamp
-                }
-            )
+            await self._put_object(key, data, f'{media_type}/{extension}', {
+                'alert_id': str(alert_id),
+                'media_type': media_type,
+                'timestamp': timestamp
+            })
             
             return f"s3://{settings.S3_BUCKET_NAME}/{key}"
             
-        except ClientError as e:
+        except (ClientError, S3UploadFailedError) as e:
             logger.error(f"Failed to upload alert media: {e}")
             return None
     
@@ -162,7 +369,7 @@ class S3Service:
             else:
                 return False
             
-            self.s3_client.delete_object(Bucket=bucket, Key=key)
+            await asyncio.to_thread(self.s3_client.delete_object, Bucket=bucket, Key=key)
             logger.info(f"Deleted S3 object: {s3_url}")
             return True
             
@@ -170,32 +377,52 @@ class S3Service:
             logger.error(f"Failed to delete S3 object: {e}")
             return False
     
+    async def _invalidate_session_files(self, device_id: str, session_id: str):
+        if self.redis_service:
+            await self.redis_service.invalidate_session_files(device_id, session_id)
+    
     async def list_session_files(self, device_id: str, session_id: str) -> Dict[str, list]:
         """List all files for a session"""
         if not self.s3_client:
             return {"audio": [], "video": []}
         
-        files = {"audio": [], "video": []}
+        if self.redis_service:
+            cached = await self.redis_service.get_cached_session_files(device_id, session_id)
+            if cached is not None:
+                return cached
         
-        for media_type in ["audio", "video"]:
-            prefix = f"{media_type}/{device_id}/{session_id}/"
-            
-            try:
-                response = self.s3_client.list_objects_v2(
+        # Both prefixes are listed concurrently
+        audio_files, video_files = await asyncio.gather(
+            asyncio.to_thread(self._list_prefix, session_prefix("audio", device_id, session_id)),
+            asyncio.to_thread(self._list_prefix, session_prefix("video", device_id, session_id))
+        )
+        files = {"audio": audio_files, "video": video_files}
+        
+        # A failed listing is partial, so only complete ones are cached
+        if self.redis_service and audio_files is not None and video_files is not None:
+            await self.redis_service.cache_session_files(device_id, session_id, files)
+        
+        return {media_type: entries or [] for media_type, entries in files.items()}
+    
+    def _list_prefix(self, prefix: str) -> Optional[list]:
+        """List every object under a prefix, following pagination past 1000 keys"""
+        try:
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            return [
+                {
+                    'key': obj['Key'],
+                    'size': obj['Size'],
+                    'last_modified': obj['LastModified'].isoformat(),
+                    's3_url': f"s3://{settings.S3_BUCKET_NAME}/{obj['Key']}"
+                }
+                for page in paginator.paginate(
                     Bucket=settings.S3_BUCKET_NAME,
-                    Prefix=prefix
+                    Prefix=prefix,
+                    PaginationConfig={'PageSize': 1000}
                 )
-                
-                if 'Contents' in response:
-                    for obj in response['Contents']:
-                        files[media_type].append({
-                            'key': obj['Key'],
-                            'size': obj['Size'],
-                            'last_modified': obj['LastModified'].isoformat(),
-                            's3_url': f"s3://{settings.S3_BUCKET_NAME}/{obj['Key']}"
-                        })
-                        
-            except ClientError as e:
-                logger.error(f"Failed to list {media_type} files: {e}")
-        
-        return files
+                for obj in page.get('Contents', [])
+            ]
+            
+        except ClientError as e:
+            logger.error(f"Failed to list files under {prefix}: {e}")
+            return None
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi import BackgroundTasks
+from sqlalchemy.dialects import postgresql
+
+from app.api.alerts import create_alert
+
+
+class RecordingSession:
+    """Captures executed statements and reports a created alert id"""
+    
+    def __init__(self):
+        self.statements = []
+        self.committed = False
+    
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return SimpleNamespace(scalar_one_or_none=lambda: 42)
+    
+    async def commit(self):
+        self.committed = True
+
+
+class RecordingRedis:
+    def __init__(self):
+        self.invalidated = []
+    
+    async def invalidate_alert_stats(self, user_id):
+        self.invalidated.append(user_id)
+
+
+def test_create_alert_inserts_metadata_column():
+    db = RecordingSession()
+    redis_service = RecordingRedis()
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(redis_service=redis_service, firebase_service=None)))
+    background_tasks = BackgroundTasks()
+    user = SimpleNamespace(id=7, firebase_uid="uid-7")
+    
+    response = asyncio.run(create_alert(
+        alert_type="crying",
+        severity="high",
+        confidence_score=0.9,
+        device_id="device-1",
+        request=request,
+        background_tasks=background_tasks,
+        description="Baby crying",
+        metadata={"source": "audio"},
+        current_user=user,
+        db=db
+    ))
+    
+    assert response["id"] == 42
+    assert db.committed
+    assert redis_service.invalidated == [7]
+    assert len(background_tasks.tasks) == 1
+    
+    sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+    assert "INSERT INTO alerts" in sql
+    assert "metadata" in sql
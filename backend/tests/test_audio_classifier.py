@@ -0,0 +1,30 @@
+import librosa
+import numpy as np
+
+from app.ml.audio_classifier import AudioFeatureExtractor
+
+
+def librosa_mfcc(audio: np.ndarray, extractor: AudioFeatureExtractor) -> np.ndarray:
+    """The normalized MFCCs the cry model was trained on"""
+    mfccs = librosa.feature.mfcc(
+        y=audio,
+        sr=extractor.sample_rate,
+        n_mfcc=extractor.n_mfcc,
+        hop_length=extractor.hop_length,
+        n_fft=extractor.n_fft
+    )
+    return (mfccs - np.mean(mfccs)) / (np.std(mfccs) + 1e-8)
+
+
+def test_mfcc_matches_librosa():
+    extractor = AudioFeatureExtractor()
+    rng = np.random.default_rng(0)
+    t = np.arange(2 * extractor.sample_rate) / extractor.sample_rate
+    # Loud edges make any difference in the padded border frames show up
+    audio = (0.5 * np.sin(2 * np.pi * 440 * t) + 0.1 * rng.standard_normal(t.shape)).astype(np.float32)
+    
+    expected = librosa_mfcc(audio, extractor)
+    actual = extractor.extract_mfcc(audio).cpu().numpy()
+    
+    assert actual.shape == expected.shape == (extractor.n_mfcc, 63)
+    np.testing.assert_allclose(actual, expected, atol=1e-3)
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+from app.ml.video_detector import VideoInferenceService, YOLODetector
+
+
+def yolo_row(cx, cy, w, h, confidence, class_id):
+    row = np.zeros(85, dtype=np.float32)
+    row[:5] = [cx, cy, w, h, confidence]
+    row[5 + class_id] = 0.9
+    return row
+
+
+def test_nms_keeps_overlapping_boxes_of_different_classes():
+    detector = YOLODetector()
+    person = detector.class_names.index("person")
+    knife = detector.class_names.index("knife")
+    raw_output = np.stack([
+        yolo_row(0.5, 0.5, 0.4, 0.6, 0.9, person),
+        yolo_row(0.5, 0.5, 0.35, 0.55, 0.8, knife),
+        yolo_row(0.51, 0.5, 0.4, 0.6, 0.85, person)
+    ])[np.newaxis]
+    
+    detections = detector._postprocess_detections(raw_output, (640, 640, 3))
+    
+    assert sorted(d["class_name"] for d in detections) == ["knife", "person"]
+    assert max(d["confidence"] for d in detections if d["class_name"] == "person") == np.float32(0.9)
+
+
+def test_reduced_decode_never_upsamples_an_axis():
+    service = VideoInferenceService()
+    for (width, height), expected_factor in [((1920, 1080), 1), ((2560, 1440), 2), ((3840, 2160), 2), ((2560, 2560), 4)]:
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        _, jpeg = cv2.imencode(".jpg", frame)
+        
+        decoded, factor, dimensions = service._decode_frame(jpeg.tobytes())
+        
+        assert dimensions == (width, height)
+        assert factor == expected_factor
+        assert decoded.shape[:2] == (height // factor, width // factor)